@@ -0,0 +1,106 @@
+"""Partitionnement et index de la table prices
+
+Revision ID: 5c9a7e3d2b18
+Revises: 8e2d4c6a1f03
+Create Date: 2026-10-19 11:26:53.718402
+
+Sur PostgreSQL, `prices` devient une table partitionnée par mois sur
+`created_at` (partition DEFAULT pour les lignes hors plage). Les partitions
+futures sont créées par `app.jobs.price_retention`. Sur les autres bases,
+seul l'index (product_id, created_at DESC) est ajouté.
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c9a7e3d2b18'
+down_revision: Union[str, None] = '8e2d4c6a1f03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 3
+
+
+def _next_month(day: date) -> date:
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def _partition_prices() -> None:
+    bind = op.get_bind()
+    op.execute("ALTER TABLE prices RENAME TO prices_legacy")
+    op.execute("ALTER INDEX ix_prices_id RENAME TO ix_prices_legacy_id")
+    op.execute("ALTER INDEX prices_pkey RENAME TO prices_legacy_pkey")
+    op.execute("""
+        CREATE TABLE prices (
+            id INTEGER NOT NULL DEFAULT nextval('prices_id_seq'),
+            amount DOUBLE PRECISION NOT NULL,
+            product_id INTEGER REFERENCES products (id) ON DELETE CASCADE,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute("CREATE TABLE prices_default PARTITION OF prices DEFAULT")
+
+    oldest = bind.execute(sa.text("SELECT min(created_at) FROM prices_legacy")).scalar()
+    month = date.today().replace(day=1)
+    if oldest is not None:
+        month = min(month, oldest.date().replace(day=1))
+    last = date.today().replace(day=1)
+    for _ in range(MONTHS_AHEAD):
+        last = _next_month(last)
+    while month <= last:
+        following = _next_month(month)
+        op.execute(
+            f"CREATE TABLE prices_{month:y%Ym%m} PARTITION OF prices "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+        )
+        month = following
+
+    op.execute("""
+        INSERT INTO prices (id, amount, product_id, created_at)
+        SELECT id, amount, product_id, COALESCE(created_at, now() AT TIME ZONE 'utc') FROM prices_legacy
+    """)
+    op.execute("ALTER SEQUENCE prices_id_seq OWNED BY prices.id")
+    op.execute("DROP TABLE prices_legacy")
+    op.create_index('ix_prices_id', 'prices', ['id'], unique=False)
+
+
+def _unpartition_prices() -> None:
+    op.execute("ALTER TABLE prices RENAME TO prices_partitioned")
+    op.execute("ALTER INDEX ix_prices_id RENAME TO ix_prices_partitioned_id")
+    op.execute("""
+        CREATE TABLE prices (
+            id INTEGER NOT NULL DEFAULT nextval('prices_id_seq'),
+            amount DOUBLE PRECISION NOT NULL,
+            product_id INTEGER REFERENCES products (id) ON DELETE CASCADE,
+            created_at TIMESTAMP WITHOUT TIME ZONE,
+            CONSTRAINT prices_pkey PRIMARY KEY (id)
+        )
+    """)
+    op.execute("INSERT INTO prices SELECT id, amount, product_id, created_at FROM prices_partitioned")
+    op.execute("ALTER SEQUENCE prices_id_seq OWNED BY prices.id")
+    op.execute("DROP TABLE prices_partitioned")
+    op.create_index('ix_prices_id', 'prices', ['id'], unique=False)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name == "postgresql":
+        _partition_prices()
+    op.create_index(
+        'ix_prices_product_id_created_at',
+        'prices',
+        ['product_id', sa.text('created_at DESC')],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_prices_product_id_created_at', table_name='prices')
+    if op.get_bind().dialect.name == "postgresql":
+        _unpartition_prices()
@@ -0,0 +1,57 @@
+"""Ajout de updated_at et de la table product_changes
+
+Revision ID: 9d4f2b7c1e65
+Revises: 5c9a7e3d2b18
+Create Date: 2026-10-19 14:02:31.506218
+
+Les produits existants sont inscrits dans le flux (un `upsert` chacun) pour
+qu'une synchronisation depuis le début retrouve tout le catalogue.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4f2b7c1e65'
+down_revision: Union[str, None] = '5c9a7e3d2b18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _clock_now():
+    # now() PostgreSQL est l'heure de début de la transaction, pas celle de l'insertion
+    if op.get_bind().dialect.name == 'postgresql':
+        return sa.text('clock_timestamp()')
+    return sa.text('CURRENT_TIMESTAMP')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('products', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.execute("UPDATE products SET updated_at = created_at")
+
+    op.create_table('product_changes',
+    sa.Column('seq', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('op', sa.String(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('changed_at', sa.DateTime(), server_default=_clock_now(), nullable=False),
+    sa.PrimaryKeyConstraint('seq')
+    )
+    op.create_index(op.f('ix_product_changes_changed_at'), 'product_changes', ['changed_at'], unique=False)
+    op.create_index('ix_product_changes_product_id_seq', 'product_changes', ['product_id', 'seq'], unique=False)
+    op.execute("""
+        INSERT INTO product_changes (product_id, op, version, changed_at)
+        SELECT id, 'upsert', version, COALESCE(created_at, CURRENT_TIMESTAMP)
+        FROM products ORDER BY id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_product_changes_product_id_seq', table_name='product_changes')
+    op.drop_index(op.f('ix_product_changes_changed_at'), table_name='product_changes')
+    op.drop_table('product_changes')
+    op.drop_column('products', 'updated_at')
@@ -0,0 +1,48 @@
+# Exchange fanout sur lequel le service publie les événements produit
+PRODUCTS_EXCHANGE = "produits"
+
+# Exchange recevant les messages rejetés par les consommateurs
+DEAD_LETTER_EXCHANGE = "produits.dlx"
+
+
+def dead_letter_queue_name(queue_name: str) -> str:
+    return f"{queue_name}.dlq"
+
+
+async def declare_consumer_topology(
+    channel,
+    queue_name: str,
+    *,
+    durable: bool = True,
+    exclusive: bool = False,
+    dead_letter: bool = True,
+):
+    """
+    Déclare l'exchange produits, la file du consommateur et sa file de dead-letter.
+
+    Les messages rejetés sans remise en file sont routés vers `<queue_name>.dlq`.
+    Sans `dead_letter` (files éphémères, ex. flux temps réel), ils sont abandonnés.
+    """
+    # aio-pika n'est utile qu'aux consommateurs : pas d'import au chargement de l'API
+    from aio_pika import ExchangeType
+
+    exchange = await channel.declare_exchange(PRODUCTS_EXCHANGE, ExchangeType.FANOUT, durable=True)
+
+    arguments = None
+    if dead_letter:
+        dead_letter_exchange = await channel.declare_exchange(DEAD_LETTER_EXCHANGE, ExchangeType.DIRECT, durable=True)
+        dead_letter_queue = await channel.declare_queue(dead_letter_queue_name(queue_name), durable=True)
+        await dead_letter_queue.bind(dead_letter_exchange, routing_key=queue_name)
+        arguments = {
+            "x-dead-letter-exchange": DEAD_LETTER_EXCHANGE,
+            "x-dead-letter-routing-key": queue_name,
+        }
+
+    queue = await channel.declare_queue(
+        queue_name,
+        durable=durable,
+        exclusive=exclusive,
+        arguments=arguments,
+    )
+    await queue.bind(exchange)
+    return queue
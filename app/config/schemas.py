@@ -1,6 +1,7 @@
-from pydantic import BaseModel, ConfigDict
-from typing import List, Optional
+from pydantic import BaseModel, ConfigDict, Field
+from typing import List, Literal, Optional
 from datetime import datetime
+from .settings import RESERVATION_MAX_TTL_SECONDS
 
 class PriceCreate(BaseModel):
     amount: float
@@ -29,10 +30,54 @@ class ProductUpdate(BaseModel):
 
 class Product(ProductBase):
     id: int
+    version: int
     created_at: datetime
+    updated_at: Optional[datetime] = None
     prices: List[Price]
 
     model_config = ConfigDict(from_attributes=True)
 
 # Alias pour la réponse (peut être identique à Product)
-ProductResponse = Product
\ No newline at end of file
+ProductResponse = Product
+
+class ProductChange(BaseModel):
+    seq: int
+    op: Literal["upsert", "delete"]
+    product_id: int
+    version: int
+    changed_at: datetime
+    # État courant du produit pour un upsert, absent pour une suppression
+    product: Optional[Product] = None
+
+class ProductChangesResponse(BaseModel):
+    changes: List[ProductChange]
+    # Jeton opaque à renvoyer dans `since` pour reprendre après ce lot
+    next_since: str
+    has_more: bool
+
+class ReservationCreate(BaseModel):
+    quantity: int = Field(gt=0)
+    # Durée de la réservation en secondes (défaut : RESERVATION_TTL_SECONDS)
+    ttl_seconds: Optional[int] = Field(None, ge=1, le=RESERVATION_MAX_TTL_SECONDS)
+
+class ReservationItem(BaseModel):
+    product_id: int
+    quantity: int = Field(gt=0)
+
+class BasketReservationCreate(BaseModel):
+    items: List[ReservationItem] = Field(min_length=1)
+    ttl_seconds: Optional[int] = Field(None, ge=1, le=RESERVATION_MAX_TTL_SECONDS)
+
+class ReservationRelease(BaseModel):
+    reservation_id: int
+
+class BasketReservationRelease(BaseModel):
+    reservation_ids: List[int] = Field(min_length=1)
+
+class Reservation(BaseModel):
+    id: int
+    product_id: int
+    quantity: int
+    expires_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from ..config.rabbitmq import declare_consumer_topology
+from ..config.settings import (
+    RABBITMQ_PREFETCH_COUNT,
+    RABBITMQ_ACK_BATCH_SIZE,
+    RABBITMQ_ACK_FLUSH_INTERVAL,
+)
+from .envelope import ProductEvent, InvalidEvent, decode_event
+
+logger = logging.getLogger(__name__)
+
+EventHandler = Callable[[ProductEvent], Awaitable[None]]
+
+
+class PoisonMessage(Exception):
+    """Message impossible à décoder : il part directement en dead-letter."""
+
+
+def decode_message(message) -> ProductEvent:
+    """
+    Décode un message de l'exchange produits selon son en-tête `content_type`.
+    """
+    try:
+        return decode_event(message.body, message.content_type)
+    except InvalidEvent as e:
+        raise PoisonMessage(str(e)) from e
+
+
+class VersionTracker:
+    """
+    Mémorise la dernière version traitée par produit (LRU borné).
+
+    Permet d'ignorer sans aller en base les redélivrances et les événements
+    arrivés après une version plus récente.
+    """
+
+    def __init__(self, max_size: int = 10_000):
+        self.max_size = max_size
+        self._versions = OrderedDict()
+
+    def is_stale(self, product_id: int, version: int) -> bool:
+        seen = self._versions.get(product_id)
+        return seen is not None and version <= seen
+
+    def mark(self, product_id: int, version: int) -> None:
+        self._versions[product_id] = max(version, self._versions.get(product_id, version))
+        self._versions.move_to_end(product_id)
+        if len(self._versions) > self.max_size:
+            self._versions.popitem(last=False)
+
+
+class ProductEventConsumer:
+    """
+    Consommateur asynchrone (aio-pika) des événements de l'exchange produits.
+
+    - `prefetch_count` borne le nombre de messages non acquittés côté broker ;
+    - les acquittements sont regroupés (`ack(multiple=True)`) tous les
+      `ack_batch_size` messages ou toutes les `ack_flush_interval` secondes ;
+    - les doublons (même produit, version déjà vue) sont acquittés sans appeler le handler ;
+    - un message en échec est remis une fois en file, puis envoyé en dead-letter.
+
+    Les messages sont traités dans l'ordre de livraison, ce qui garantit qu'un
+    acquittement groupé ne couvre que des messages déjà traités.
+    """
+
+    def __init__(
+        self,
+        handler: EventHandler,
+        queue_name: str,
+        *,
+        prefetch_count: int = RABBITMQ_PREFETCH_COUNT,
+        ack_batch_size: int = RABBITMQ_ACK_BATCH_SIZE,
+        ack_flush_interval: float = RABBITMQ_ACK_FLUSH_INTERVAL,
+        tracker: Optional[VersionTracker] = None,
+        decoder: Callable[[object], ProductEvent] = decode_message,
+        exclusive: bool = False,
+        dead_letter: bool = True,
+    ):
+        self.handler = handler
+        self.queue_name = queue_name
+        self.prefetch_count = prefetch_count
+        # Un lot plus grand que le prefetch bloquerait le broker jusqu'au flush périodique
+        self.ack_batch_size = max(1, min(ack_batch_size, prefetch_count))
+        self.ack_flush_interval = ack_flush_interval
+        self.tracker = tracker or VersionTracker()
+        self.decoder = decoder
+        self.exclusive = exclusive
+        self.dead_letter = dead_letter
+
+        self._queue = None
+        self._last_processed = None
+        self._pending_acks = 0
+
+    async def start(self, connection):
+        """Ouvre un canal, règle le prefetch et déclare la topologie."""
+        channel = await connection.channel()
+        await channel.set_qos(prefetch_count=self.prefetch_count)
+        self._queue = await declare_consumer_topology(
+            channel,
+            self.queue_name,
+            durable=not self.exclusive,
+            exclusive=self.exclusive,
+            dead_letter=self.dead_letter,
+        )
+        return self._queue
+
+    async def run(self, connection):
+        """Consomme la file jusqu'à sa fermeture ou l'annulation de la tâche."""
+        queue = await self.start(connection)
+        flusher = asyncio.create_task(self._flush_periodically())
+        try:
+            async with queue.iterator() as messages:
+                async for message in messages:
+                    await self.process(message)
+        finally:
+            flusher.cancel()
+            await self.flush_acks()
+
+    async def process(self, message) -> None:
+        try:
+            event = self.decoder(message)
+        except PoisonMessage:
+            logger.exception("Message produit illisible, envoi en dead-letter")
+            await message.reject(requeue=False)
+            return
+
+        product_id, version = event.product_id, event.version
+        if self.tracker.is_stale(product_id, version):
+            await self._ack(message)
+            return
+
+        try:
+            await self.handler(event)
+        except Exception:
+            if message.redelivered:
+                logger.exception("Échec définitif du traitement du produit %s, envoi en dead-letter", product_id)
+                await message.reject(requeue=False)
+            else:
+                logger.warning("Échec du traitement du produit %s, remise en file", product_id, exc_info=True)
+                await message.nack(requeue=True)
+            return
+
+        self.tracker.mark(product_id, version)
+        await self._ack(message)
+
+    async def flush_acks(self) -> None:
+        """Acquitte d'un coup tous les messages traités depuis le dernier flush."""
+        message = self._last_processed
+        if message is None:
+            return
+        self._last_processed = None
+        self._pending_acks = 0
+        await message.ack(multiple=True)
+
+    async def _ack(self, message) -> None:
+        self._last_processed = message
+        self._pending_acks += 1
+        if self._pending_acks >= self.ack_batch_size:
+            await self.flush_acks()
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.ack_flush_interval)
+            await self.flush_acks()
@@ -0,0 +1,131 @@
+"""
+Enveloppe versionnée des événements produit publiés sur l'exchange « produits ».
+
+Un événement ne transporte que le type, l'identifiant, la version du produit et
+les champs modifiés (`changes`), et non plus la réponse API complète avec tout
+l'historique de prix. Le format d'encodage est indiqué par l'en-tête
+`content_type` : JSON (par défaut) ou msgpack, plus compact et plus rapide à décoder.
+"""
+import json
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Optional
+
+import msgpack
+from pydantic import BaseModel, Field, ValidationError
+
+EVENT_SCHEMA_VERSION = 1
+
+JSON_CONTENT_TYPE = "application/json"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+SUPPORTED_CONTENT_TYPES = (JSON_CONTENT_TYPE, MSGPACK_CONTENT_TYPE)
+
+
+class EventType(str, Enum):
+    CREATED = "product.created"
+    UPDATED = "product.updated"
+    DELETED = "product.deleted"
+
+
+class InvalidEvent(ValueError):
+    """Corps de message qui ne peut pas être converti en événement produit."""
+
+
+class ProductEvent(BaseModel):
+    schema_version: int = EVENT_SCHEMA_VERSION
+    event_type: EventType
+    product_id: int
+    version: int
+    occurred_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    # Champs modifiés : name, description, stock, prices (liste des montants)
+    changes: dict = Field(default_factory=dict)
+
+
+def product_snapshot(product) -> dict:
+    """Valeurs publiées d'un produit ORM (prix dans l'ordre d'insertion)."""
+    return {
+        "name": product.name,
+        "description": product.description,
+        "stock": product.stock,
+        "prices": [price.amount for price in sorted(product.prices, key=lambda price: price.id)],
+    }
+
+
+def product_created_event(product) -> ProductEvent:
+    return ProductEvent(
+        event_type=EventType.CREATED,
+        product_id=product.id,
+        version=product.version,
+        changes=product_snapshot(product),
+    )
+
+
+def product_updated_event(product, before: dict) -> ProductEvent:
+    """Événement de mise à jour ne contenant que les champs qui diffèrent de `before`."""
+    after = product_snapshot(product)
+    return ProductEvent(
+        event_type=EventType.UPDATED,
+        product_id=product.id,
+        version=product.version,
+        changes={field: value for field, value in after.items() if before.get(field) != value},
+    )
+
+
+def product_stock_event(product_id: int, version: int, stock: int) -> ProductEvent:
+    """Mise à jour du seul stock (réservations), sans recharger le produit."""
+    return ProductEvent(
+        event_type=EventType.UPDATED,
+        product_id=product_id,
+        version=version,
+        changes={"stock": stock},
+    )
+
+
+def product_deleted_event(product_id: int, version: int) -> ProductEvent:
+    return ProductEvent(event_type=EventType.DELETED, product_id=product_id, version=version)
+
+
+def negotiate_content_type(requested: Optional[str]) -> str:
+    if requested in SUPPORTED_CONTENT_TYPES:
+        return requested
+    return JSON_CONTENT_TYPE
+
+
+def encode_event(event: ProductEvent, content_type: str = JSON_CONTENT_TYPE) -> bytes:
+    if content_type == MSGPACK_CONTENT_TYPE:
+        return msgpack.packb(event.model_dump(mode="json"))
+    return event.model_dump_json().encode()
+
+
+def decode_event(body: bytes, content_type: Optional[str] = JSON_CONTENT_TYPE) -> ProductEvent:
+    """
+    Décode un événement selon son `content_type`.
+
+    Les anciens messages (réponse produit complète en JSON, sans enveloppe) sont
+    convertis en événement `product.updated` portant tous les champs.
+    """
+    try:
+        if content_type == MSGPACK_CONTENT_TYPE:
+            data = msgpack.unpackb(body)
+        else:
+            data = json.loads(body)
+        if isinstance(data, dict) and "event_type" not in data and "id" in data:
+            data = _from_legacy_payload(data)
+        return ProductEvent.model_validate(data)
+    except (ValueError, TypeError, ValidationError, msgpack.UnpackException) as e:
+        raise InvalidEvent(f"Événement produit illisible : {e}") from e
+
+
+def _from_legacy_payload(product: dict) -> dict:
+    prices = sorted(product.get("prices") or [], key=lambda price: price.get("id", 0))
+    return {
+        "event_type": EventType.UPDATED,
+        "product_id": product["id"],
+        "version": product.get("version", 0),
+        "changes": {
+            "name": product.get("name"),
+            "description": product.get("description"),
+            "stock": product.get("stock"),
+            "prices": [price["amount"] for price in prices],
+        },
+    }
@@ -0,0 +1,227 @@
+"""
+Répartition des événements produit vers les connexions SSE / WebSocket d'un worker.
+
+Le hub n'a qu'une source (une file RabbitMQ exclusive au worker), démarrée au
+premier abonnement. Chaque événement est encodé une seule fois puis déposé dans
+la file bornée de chaque abonné intéressé : un abonné trop lent est déconnecté
+(`lagged`) plutôt que de ralentir les autres, et se resynchronise via
+GET /api/products/changes.
+"""
+import asyncio
+import logging
+import os
+import socket
+from collections import defaultdict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Awaitable, Callable, FrozenSet, Optional
+
+from prometheus_client import Counter, Gauge
+
+from ..config.settings import (
+    RABBITMQ_URL,
+    STREAM_QUEUE_PREFIX,
+    STREAM_SUBSCRIBER_BUFFER,
+    STREAM_RECONNECT_SECONDS,
+)
+from .consumer import EventHandler, ProductEventConsumer
+from .envelope import ProductEvent, encode_event
+
+logger = logging.getLogger(__name__)
+
+STREAM_SUBSCRIBERS = Gauge(
+    "product_stream_subscribers",
+    "Connexions abonnées au flux des événements produit",
+    ["transport"],
+)
+STREAM_EVENTS = Counter(
+    "product_stream_events_total",
+    "Événements produit reçus par le hub",
+)
+STREAM_DELIVERIES = Counter(
+    "product_stream_deliveries_total",
+    "Événements déposés dans les files des abonnés",
+)
+STREAM_LAGGED = Counter(
+    "product_stream_lagged_total",
+    "Abonnés déconnectés car trop lents",
+)
+
+EventSource = Callable[[EventHandler], Awaitable[None]]
+
+_LAGGED = object()
+_CLOSED = object()
+
+
+class SubscriptionClosed(Exception):
+    """Fin d'un abonnement : `reason` vaut "lagged" ou "shutdown"."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+@dataclass(frozen=True)
+class StreamMessage:
+    event_type: str
+    product_id: int
+    data: str
+    sse: bytes
+
+    @classmethod
+    def from_event(cls, event: ProductEvent) -> "StreamMessage":
+        data = encode_event(event).decode()
+        event_type = event.event_type.value
+        return cls(event_type, event.product_id, data, f"event: {event_type}\ndata: {data}\n\n".encode())
+
+
+class Subscription:
+    def __init__(self, hub, product_ids: Optional[FrozenSet[int]], transport: str, buffer: int):
+        self.hub = hub
+        self.product_ids = product_ids
+        self.transport = transport
+        self._queue = asyncio.Queue(buffer)
+        self._open = True
+
+    async def get(self) -> StreamMessage:
+        message = await self._queue.get()
+        if message is _LAGGED:
+            raise SubscriptionClosed("lagged")
+        if message is _CLOSED:
+            raise SubscriptionClosed("shutdown")
+        return message
+
+    def offer(self, message) -> bool:
+        if not self._open:
+            return False
+        try:
+            self._queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            # Abonné trop lent : ses événements en attente sont abandonnés et il est déconnecté
+            STREAM_LAGGED.inc()
+            self.end(_LAGGED)
+            return False
+
+    def end(self, signal) -> None:
+        self._open = False
+        # À l'arrêt, les événements déjà reçus sont encore envoyés avant le signal
+        if signal is _LAGGED or self._queue.full():
+            while not self._queue.empty():
+                self._queue.get_nowait()
+        self._queue.put_nowait(signal)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.hub.unsubscribe(self)
+
+
+class EventHub:
+    """
+    Hub propre à un worker, alimenté par sa source via `handle` ; la répartition
+    a lieu dans la boucle asyncio des abonnés.
+    """
+
+    def __init__(self, source: Optional[EventSource] = None, buffer: int = STREAM_SUBSCRIBER_BUFFER):
+        self.source = source
+        self.buffer = buffer
+        self._all = set()
+        self._by_product = defaultdict(set)
+        self._loop = None
+        self._source_task = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._all.union(*self._by_product.values()))
+
+    def subscribe(self, product_ids: Optional[FrozenSet[int]] = None, transport: str = "sse") -> Subscription:
+        """À appeler depuis la boucle asyncio ; s'utilise comme context manager."""
+        self._loop = asyncio.get_running_loop()
+        if self.source is not None and self._source_task is None:
+            self._source_task = self._loop.create_task(self.source(self.handle))
+
+        subscription = Subscription(self, product_ids, transport, self.buffer)
+        if product_ids:
+            for product_id in product_ids:
+                self._by_product[product_id].add(subscription)
+        else:
+            self._all.add(subscription)
+        STREAM_SUBSCRIBERS.labels(transport=transport).inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        if subscription.product_ids:
+            for product_id in subscription.product_ids:
+                subscriptions = self._by_product.get(product_id)
+                if subscriptions is not None:
+                    subscriptions.discard(subscription)
+                    if not subscriptions:
+                        del self._by_product[product_id]
+        else:
+            self._all.discard(subscription)
+        STREAM_SUBSCRIBERS.labels(transport=subscription.transport).dec()
+
+    async def handle(self, event: ProductEvent) -> None:
+        """Handler de `ProductEventConsumer` (dans la boucle du hub)."""
+        self._dispatch(event)
+
+    def publish(self, event: ProductEvent) -> None:
+        """
+        Point d'injection pour les tests (sans broker), appelable depuis n'importe
+        quel thread. En production, les événements n'arrivent que par la source.
+        """
+        if self._loop is None:
+            return  # aucun abonné n'a encore été servi
+        self._loop.call_soon_threadsafe(self._dispatch, event)
+
+    def close(self) -> None:
+        """Arrête la source et termine tous les abonnements (thread-safe)."""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._close)
+
+    def _dispatch(self, event: ProductEvent) -> None:
+        STREAM_EVENTS.inc()
+        targets = self._all | self._by_product.get(event.product_id, set())
+        if not targets:
+            return
+        message = StreamMessage.from_event(event)
+        STREAM_DELIVERIES.inc(sum(subscription.offer(message) for subscription in targets))
+
+    def _close(self) -> None:
+        if self._source_task is not None:
+            self._source_task.cancel()
+            self._source_task = None
+        for subscription in self._all.union(*self._by_product.values()):
+            subscription.end(_CLOSED)
+
+
+def stream_queue_name() -> str:
+    return f"{STREAM_QUEUE_PREFIX}.{socket.gethostname()}.{os.getpid()}"
+
+
+async def consume_product_events(handler: EventHandler) -> None:
+    """Source du hub : file exclusive (supprimée à la déconnexion) liée à l'exchange produits."""
+    import aio_pika
+
+    while True:
+        try:
+            connection = await aio_pika.connect_robust(RABBITMQ_URL)
+            async with connection:
+                consumer = ProductEventConsumer(handler, stream_queue_name(), exclusive=True, dead_letter=False)
+                await consumer.run(connection)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.warning(
+                "Flux produit : RabbitMQ indisponible, nouvel essai dans %ss",
+                STREAM_RECONNECT_SECONDS,
+                exc_info=True,
+            )
+        await asyncio.sleep(STREAM_RECONNECT_SECONDS)
+
+
+@lru_cache
+def get_event_hub() -> EventHub:
+    return EventHub(consume_product_events)
@@ -0,0 +1,213 @@
+"""
+Projection de référence : copie locale dénormalisée des produits.
+
+Un service consommateur lance `python -m app.events.projection` (ou réutilise
+`ProductProjectionHandler` dans sa propre boucle) et lit ensuite la table
+`product_projections` au lieu d'appeler `GET /api/products/{id}`.
+
+La table vit dans la base du consommateur : elle a sa propre `MetaData` pour ne
+pas apparaître dans les migrations du service produit.
+"""
+import asyncio
+import logging
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, create_engine, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+
+from ..config.settings import (
+    RABBITMQ_URL,
+    PROJECTION_QUEUE,
+    PROJECTION_DATABASE_URL,
+    PRODUCT_API_URL,
+    PRODUCT_API_TOKEN,
+)
+from .consumer import ProductEventConsumer
+from .envelope import ProductEvent, EventType, decode_event, product_deleted_event
+
+logger = logging.getLogger(__name__)
+
+# Champs d'un événement portant l'état complet du produit
+FULL_STATE_FIELDS = ("name", "description", "stock", "prices")
+
+ProjectionBase = declarative_base()
+
+
+class ProductProjection(ProjectionBase):
+    __tablename__ = "product_projections"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+    description = Column(String)
+    stock = Column(Integer)
+    price = Column(Float)  # Dernier prix connu
+    version = Column(Integer, nullable=False, default=0)
+    deleted = Column(Boolean, nullable=False, default=False)
+    synced_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class ProjectionGap(Exception):
+    """La resynchronisation n'a pas rattrapé la version de l'événement : il sera remis en file."""
+
+
+def fetch_product_state(product_id: int) -> Optional[ProductEvent]:
+    """État complet du produit lu sur l'API produits (None s'il n'existe plus)."""
+    request = urllib.request.Request(f"{PRODUCT_API_URL}/api/products/{product_id}")
+    if PRODUCT_API_TOKEN:
+        request.add_header("Authorization", f"Bearer {PRODUCT_API_TOKEN}")
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            body = response.read()
+    except urllib.error.HTTPError as e:
+        if e.code == 404:
+            return None
+        raise
+    # La réponse produit complète est décodée comme un événement portant tous les champs
+    return decode_event(body)
+
+
+def is_full_state(event: ProductEvent) -> bool:
+    if event.event_type != EventType.UPDATED:
+        return True
+    return all(field in event.changes for field in FULL_STATE_FIELDS)
+
+
+class ProductProjectionHandler:
+    """
+    Applique les événements produit à la table `product_projections`.
+
+    Les créations, suppressions et événements complets remplacent la ligne si
+    leur version est strictement plus récente. Une mise à jour ne porte que les
+    champs modifiés : elle n'est appliquée que sur la version précédente
+    (`version == stockée + 1`). Sinon (produit inconnu, version manquante),
+    l'état complet est relu via `resync` avant d'appliquer l'événement.
+
+    Rejouer un événement ou le recevoir en retard est sans effet. Les suppressions
+    laissent une ligne marquée `deleted` pour qu'un événement en retard ne la recrée pas.
+    """
+
+    def __init__(self, session_factory, resync: Callable[[int], Optional[ProductEvent]] = fetch_product_state):
+        self.session_factory = session_factory
+        self.resync = resync
+
+    async def __call__(self, event: ProductEvent) -> None:
+        # Les sessions SQLAlchemy sont synchrones : on ne bloque pas la boucle du consommateur
+        await asyncio.to_thread(self.apply, event)
+
+    def apply(self, event: ProductEvent) -> bool:
+        """Retourne True si la projection a été modifiée."""
+        if is_full_state(event):
+            return self._apply_full_state(event)
+
+        with self.session_factory() as db:
+            applied = self._apply_delta(db, event)
+        if applied is not None:
+            return applied
+
+        logger.info("Version manquante avant %s du produit %s, resynchronisation", event.version, event.product_id)
+        state = self.resync(event.product_id)
+        if state is None:
+            state = product_deleted_event(event.product_id, event.version)
+        resynced = self._apply_full_state(state)
+
+        with self.session_factory() as db:
+            applied = self._apply_delta(db, event)
+        if applied is None:
+            raise ProjectionGap(
+                f"Produit {event.product_id} : version {event.version} toujours inapplicable après resynchronisation"
+            )
+        return resynced or applied
+
+    def _apply_full_state(self, event: ProductEvent) -> bool:
+        values = _projection_values(event)
+        with self.session_factory() as db:
+            try:
+                return self._upsert(db, event.product_id, values)
+            except IntegrityError:
+                # Un autre consommateur a inséré la ligne entre-temps
+                db.rollback()
+                return self._upsert(db, event.product_id, values)
+
+    def _apply_delta(self, db: Session, event: ProductEvent) -> Optional[bool]:
+        """True si appliqué, False si déjà couvert, None s'il manque une version."""
+        stored = db.get(ProductProjection, event.product_id)
+        if stored is not None and (stored.deleted or stored.version >= event.version):
+            return False
+        if stored is None or stored.version != event.version - 1:
+            return None
+
+        result = db.execute(
+            update(ProductProjection)
+            .where(ProductProjection.id == event.product_id)
+            .where(ProductProjection.version == event.version - 1)
+            .values(**_projection_values(event))
+        )
+        if not result.rowcount:
+            # Modifiée entre la lecture et l'UPDATE : on réévalue
+            db.rollback()
+            return self._apply_delta(db, event)
+        db.commit()
+        return True
+
+    def _upsert(self, db: Session, product_id: int, values: dict) -> bool:
+        result = db.execute(
+            update(ProductProjection)
+            .where(ProductProjection.id == product_id)
+            .where(ProductProjection.version < values["version"])
+            .values(**values)
+        )
+        if result.rowcount:
+            db.commit()
+            return True
+
+        if db.get(ProductProjection, product_id) is not None:
+            # Version déjà appliquée (ou plus récente)
+            return False
+
+        db.add(ProductProjection(id=product_id, **values))
+        db.commit()
+        return True
+
+
+def _projection_values(event: ProductEvent) -> dict:
+    values = {
+        "version": event.version,
+        "deleted": event.event_type == EventType.DELETED,
+        "synced_at": datetime.now(timezone.utc),
+    }
+    for field in ("name", "description", "stock"):
+        if field in event.changes:
+            values[field] = event.changes[field]
+    if event.changes.get("prices"):
+        values["price"] = event.changes["prices"][-1]
+    return values
+
+
+def get_projected_product(db: Session, product_id: int):
+    """Lecture locale d'un produit projeté (None si inconnu ou supprimé)."""
+    projected = db.get(ProductProjection, product_id)
+    if projected is None or projected.deleted:
+        return None
+    return projected
+
+
+async def main():
+    import aio_pika
+
+    engine = create_engine(PROJECTION_DATABASE_URL)
+    ProjectionBase.metadata.create_all(bind=engine)
+    handler = ProductProjectionHandler(sessionmaker(bind=engine, autoflush=False))
+    consumer = ProductEventConsumer(handler, PROJECTION_QUEUE)
+
+    connection = await aio_pika.connect_robust(RABBITMQ_URL)
+    async with connection:
+        await consumer.run(connection)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,240 @@
+"""
+Faux broker AMQP en mémoire pour tester les consommateurs sans RabbitMQ.
+
+Implémente le sous-ensemble d'aio-pika utilisé par `ProductEventConsumer` :
+canaux avec prefetch, exchanges fanout/direct, files avec dead-letter,
+itérateur de consommation et ack/nack/reject (y compris `multiple=True`).
+"""
+import asyncio
+import itertools
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+from aio_pika import ExchangeType
+
+from ..config.rabbitmq import PRODUCTS_EXCHANGE
+from .envelope import encode_event
+
+_CLOSED = object()
+
+
+@dataclass
+class _Delivery:
+    body: bytes
+    content_type: Optional[str] = None
+    headers: dict = field(default_factory=dict)
+    redelivered: bool = False
+
+
+class InMemoryMessage:
+    def __init__(self, channel, queue, delivery: _Delivery, delivery_tag: int):
+        self.channel = channel
+        self.queue = queue
+        self.delivery = delivery
+        self.delivery_tag = delivery_tag
+        self.body = delivery.body
+        self.content_type = delivery.content_type
+        self.headers = delivery.headers
+        self.redelivered = delivery.redelivered
+
+    async def ack(self, multiple: bool = False) -> None:
+        self.channel.ack_calls += 1
+        for message in self.channel._settle(self.delivery_tag, multiple):
+            message.queue.acked.append(message.body)
+
+    async def nack(self, multiple: bool = False, requeue: bool = True) -> None:
+        for message in self.channel._settle(self.delivery_tag, multiple):
+            message.queue._return(message.delivery, requeue)
+
+    async def reject(self, requeue: bool = False) -> None:
+        await self.nack(multiple=False, requeue=requeue)
+
+
+class _QueueIterator:
+    def __init__(self, queue):
+        self.queue = queue
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        channel = self.queue.channel
+        async with channel._settled:
+            await channel._settled.wait_for(channel._can_deliver)
+        delivery = await self.queue._deliveries.get()
+        if delivery is _CLOSED:
+            raise StopAsyncIteration
+        return channel._deliver(self.queue, delivery)
+
+
+class InMemoryQueue:
+    def __init__(self, broker, name: str, arguments: Optional[dict] = None):
+        self.broker = broker
+        self.name = name
+        self.arguments = arguments or {}
+        self.channel = None
+        self.consumed = False
+        self.acked = []
+        self._deliveries = asyncio.Queue()
+
+    async def bind(self, exchange, routing_key: str = "") -> None:
+        exchange.bindings.append((self, routing_key))
+
+    def iterator(self, **kwargs):
+        self.consumed = True
+        return _QueueIterator(self)
+
+    def messages(self):
+        """Messages en attente (non livrés), dans l'ordre."""
+        return [d for d in self._deliveries._queue if d is not _CLOSED]
+
+    def _put(self, delivery: _Delivery) -> None:
+        self._deliveries.put_nowait(delivery)
+
+    def _return(self, delivery: _Delivery, requeue: bool) -> None:
+        if requeue:
+            delivery.redelivered = True
+            self._put(delivery)
+            return
+        exchange = self.arguments.get("x-dead-letter-exchange")
+        if exchange:
+            routing_key = self.arguments.get("x-dead-letter-routing-key", "")
+            self.broker._route(exchange, routing_key, _Delivery(delivery.body, delivery.content_type, delivery.headers))
+
+
+class InMemoryExchange:
+    def __init__(self, broker, name: str, type: ExchangeType):
+        self.broker = broker
+        self.name = name
+        self.type = type
+        self.bindings = []
+
+    async def publish(self, message, routing_key: str = "") -> None:
+        self.broker._route(
+            self.name,
+            routing_key,
+            _Delivery(message.body, getattr(message, "content_type", None), dict(getattr(message, "headers", None) or {})),
+        )
+
+
+class InMemoryChannel:
+    def __init__(self, broker):
+        self.broker = broker
+        self.prefetch_count = 0
+        self.ack_calls = 0
+        self._unacked = OrderedDict()
+        self._settled = asyncio.Condition()
+
+    async def set_qos(self, prefetch_count: int = 0, **kwargs) -> None:
+        self.prefetch_count = prefetch_count
+
+    async def declare_exchange(self, name: str, type: ExchangeType = ExchangeType.DIRECT, **kwargs):
+        if name not in self.broker.exchanges:
+            self.broker.exchanges[name] = InMemoryExchange(self.broker, name, ExchangeType(type))
+        return self.broker.exchanges[name]
+
+    async def declare_queue(self, name: str, *, arguments: Optional[dict] = None, **kwargs):
+        if name not in self.broker.queues:
+            self.broker.queues[name] = InMemoryQueue(self.broker, name, arguments)
+        queue = self.broker.queues[name]
+        queue.channel = self
+        return queue
+
+    @property
+    def unacked_count(self) -> int:
+        return len(self._unacked)
+
+    def _can_deliver(self) -> bool:
+        return not self.prefetch_count or len(self._unacked) < self.prefetch_count
+
+    def _deliver(self, queue, delivery: _Delivery) -> InMemoryMessage:
+        message = InMemoryMessage(self, queue, delivery, next(self.broker._tags))
+        self._unacked[message.delivery_tag] = message
+        return message
+
+    def _settle(self, delivery_tag: int, multiple: bool):
+        if delivery_tag not in self._unacked:
+            # RabbitMQ fermerait le canal (PRECONDITION_FAILED)
+            raise RuntimeError(f"delivery tag inconnu : {delivery_tag}")
+        if multiple:
+            tags = [tag for tag in self._unacked if tag <= delivery_tag]
+        else:
+            tags = [delivery_tag]
+        settled = [self._unacked.pop(tag) for tag in tags]
+        asyncio.get_running_loop().create_task(self._notify())
+        return settled
+
+    async def _notify(self) -> None:
+        async with self._settled:
+            self._settled.notify_all()
+
+
+class InMemoryBroker:
+    """
+    Faux broker : se passe à `ProductEventConsumer.run()` à la place d'une connexion aio-pika.
+    """
+
+    def __init__(self):
+        self.exchanges = {}
+        self.queues = {}
+        self._tags = itertools.count(1)
+
+    async def channel(self) -> InMemoryChannel:
+        return InMemoryChannel(self)
+
+    async def publish(
+        self,
+        body: bytes,
+        *,
+        exchange: str = PRODUCTS_EXCHANGE,
+        routing_key: str = "",
+        content_type: str = "application/json",
+        headers: Optional[dict] = None,
+    ) -> None:
+        self._route(exchange, routing_key, _Delivery(body, content_type, dict(headers or {})))
+
+    async def wait_until_idle(self, timeout: float = 5.0) -> None:
+        """Attend que les files consommées soient vides et tous leurs messages acquittés."""
+        async def _idle():
+            while any(
+                not queue._deliveries.empty() or queue.channel.unacked_count
+                for queue in self.queues.values()
+                if queue.consumed
+            ):
+                await asyncio.sleep(0.005)
+
+        await asyncio.wait_for(_idle(), timeout)
+
+    async def close(self) -> None:
+        for queue in self.queues.values():
+            queue._put(_CLOSED)
+
+    def _route(self, exchange_name: str, routing_key: str, delivery: _Delivery) -> None:
+        exchange = self.exchanges.get(exchange_name)
+        if exchange is None:
+            return
+        for queue, binding_key in exchange.bindings:
+            if exchange.type == ExchangeType.FANOUT or binding_key == routing_key:
+                queue._put(_Delivery(delivery.body, delivery.content_type, dict(delivery.headers)))
+
+
+class InMemoryPublisher:
+    """
+    Remplace `RabbitMQPublisher` dans les tests (override de `get_publisher`) :
+    les événements sont encodés comme en production puis conservés en mémoire.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.messages = []
+
+    def publish(self, event) -> None:
+        self.messages.append(encode_event(event))
+        self.events.append(event)
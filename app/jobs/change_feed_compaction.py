@@ -0,0 +1,76 @@
+"""
+Compaction du flux de changements produit (`product_changes`).
+
+Chaque écriture (y compris chaque réservation et libération de stock) ajoute une
+entrée au flux, qui ne sert pourtant que la dernière entrée de chaque produit :
+
+- les entrées remplacées par une entrée plus récente du même produit sont
+  supprimées ; un client qui reprend avant elles reçoit l'entrée suivante, avec
+  l'état courant du produit. Sans effet sur ce que voit un client ;
+- les suppressions (tombstones) plus anciennes que la rétention sont supprimées :
+  un client dont le jeton de reprise est plus ancien que
+  CHANGE_FEED_TOMBSTONE_RETENTION_DAYS doit resynchroniser depuis le début.
+
+Usage : python -m app.jobs.change_feed_compaction (à planifier, ex. toutes les heures)
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, exists, select
+from sqlalchemy.orm import Session, aliased
+
+from ..config.database import SessionLocal, get_engine
+from ..config.settings import CHANGE_FEED_TOMBSTONE_RETENTION_DAYS
+from ..models.product_change import ProductChange, CHANGE_DELETE
+
+logger = logging.getLogger(__name__)
+
+
+def compact_product_changes(
+    db: Session,
+    tombstone_retention_days: int = CHANGE_FEED_TOMBSTONE_RETENTION_DAYS,
+    batch_size: int = 1000,
+) -> int:
+    """
+    Compacte le flux par lots de `batch_size` entrées (transactions courtes), en
+    avançant dans l'ordre des `seq`. Retourne le nombre d'entrées supprimées.
+    """
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=tombstone_retention_days)
+    newer = aliased(ProductChange)
+    superseded = exists().where(newer.product_id == ProductChange.product_id, newer.seq > ProductChange.seq)
+    expired_tombstone = (ProductChange.op == CHANGE_DELETE) & (ProductChange.changed_at < cutoff)
+
+    deleted = 0
+    last_seq = 0
+    while True:
+        seqs = db.execute(
+            select(ProductChange.seq)
+            .where(ProductChange.seq > last_seq)
+            .where(superseded | expired_tombstone)
+            .order_by(ProductChange.seq)
+            .limit(batch_size)
+        ).scalars().all()
+        if not seqs:
+            break
+        last_seq = seqs[-1]
+
+        result = db.execute(
+            delete(ProductChange)
+            .where(ProductChange.seq.in_(seqs))
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        deleted += result.rowcount
+
+    return deleted
+
+
+def main():
+    with SessionLocal(bind=get_engine()) as db:
+        deleted = compact_product_changes(db)
+    logger.info("Entrées du flux de changements compactées : %d", deleted)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
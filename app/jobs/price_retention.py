@@ -0,0 +1,130 @@
+"""
+Maintenance de l'historique des prix.
+
+- `compact_price_history` : au-delà de la durée de rétention, ne garde que le
+  dernier prix de chaque jour pour chaque produit (instantané journalier).
+  Les prix du dernier jour d'un produit, c'est-à-dire son jeu de prix courant,
+  ne sont jamais touchés. Requêtes portables (PostgreSQL et SQLite).
+- `ensure_price_partitions` : crée à l'avance les partitions mensuelles de
+  `prices` (PostgreSQL partitionné uniquement, voir la migration 5c9a7e3d2b18).
+
+Usage : python -m app.jobs.price_retention
+"""
+import logging
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.orm import Session, aliased
+
+from ..config.database import SessionLocal, get_engine
+from ..config.settings import PRICE_HISTORY_RETENTION_DAYS, PRICE_PARTITION_MONTHS_AHEAD
+from ..models.price import Price as PriceModel
+from ..models.product import Product as ProductModel
+
+logger = logging.getLogger(__name__)
+
+
+def compact_price_history(
+    db: Session,
+    older_than_days: int = PRICE_HISTORY_RETENTION_DAYS,
+    batch_size: int = 1000,
+) -> int:
+    """
+    Compacte l'historique par lots de `batch_size` produits (transactions courtes).
+    Retourne le nombre de lignes supprimées.
+    """
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=older_than_days)
+    day = func.date(PriceModel.created_at)
+
+    # Dernier jour de prix du produit de la ligne examinée (sous-requête corrélée)
+    same_product = aliased(PriceModel)
+    latest_day = (
+        select(func.max(func.date(same_product.created_at)))
+        .where(same_product.product_id == PriceModel.product_id)
+        .scalar_subquery()
+    )
+    snapshot = aliased(PriceModel)
+    snapshot_day = func.date(snapshot.created_at)
+
+    deleted = 0
+    last_product_id = 0
+    while True:
+        product_ids = db.execute(
+            select(ProductModel.id)
+            .where(ProductModel.id > last_product_id)
+            .order_by(ProductModel.id)
+            .limit(batch_size)
+        ).scalars().all()
+        if not product_ids:
+            break
+        first, last_product_id = product_ids[0], product_ids[-1]
+        in_batch = PriceModel.product_id.between(first, last_product_id)
+
+        # Dernière ligne de chaque (produit, jour) : l'instantané conservé
+        snapshots = (
+            select(func.max(snapshot.id))
+            .where(snapshot.product_id.between(first, last_product_id), snapshot.created_at < cutoff)
+            .group_by(snapshot.product_id, snapshot_day)
+        )
+        result = db.execute(
+            delete(PriceModel)
+            .where(in_batch)
+            .where(PriceModel.created_at < cutoff)
+            .where(PriceModel.id.not_in(snapshots))
+            .where(day < latest_day)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        deleted += result.rowcount
+
+    return deleted
+
+
+def _next_month(day: date) -> date:
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def is_partitioned(db: Session) -> bool:
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    relkind = db.execute(text("SELECT relkind FROM pg_class WHERE relname = 'prices'")).scalar()
+    return relkind == "p"
+
+
+def ensure_price_partitions(db: Session, months_ahead: int = PRICE_PARTITION_MONTHS_AHEAD) -> list:
+    """
+    Crée les partitions mensuelles manquantes jusqu'à `months_ahead` mois.
+
+    Elles doivent exister avant que des lignes de ce mois n'arrivent dans la
+    partition DEFAULT, sinon PostgreSQL refuse de les créer.
+    """
+    if not is_partitioned(db):
+        return []
+
+    created = []
+    month = date.today().replace(day=1)
+    for _ in range(months_ahead + 1):
+        following = _next_month(month)
+        name = f"prices_{month:y%Ym%m}"
+        exists = db.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar()
+        if exists is None:
+            db.execute(text(
+                f"CREATE TABLE {name} PARTITION OF prices "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+            ))
+            created.append(name)
+        month = following
+    db.commit()
+    return created
+
+
+def main():
+    with SessionLocal(bind=get_engine()) as db:
+        partitions = ensure_price_partitions(db)
+        deleted = compact_price_history(db)
+    logger.info("Partitions créées : %s ; prix compactés : %d", partitions or "aucune", deleted)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
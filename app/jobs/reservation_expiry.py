@@ -0,0 +1,62 @@
+"""
+Libération des réservations de stock expirées.
+
+Chaque lot est libéré dans sa propre transaction : les réservations sont
+supprimées et leur stock rendu en une seule mise à jour par produit.
+
+Usage : python -m app.jobs.reservation_expiry (à planifier, ex. toutes les minutes)
+"""
+import logging
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..config.database import SessionLocal, get_engine
+from ..models.reservation import StockReservation
+from ..routers.rabbitmq import get_publisher, publish_events
+from ..routers.reservation import release_reservations
+
+logger = logging.getLogger(__name__)
+
+
+def release_expired_reservations(db: Session, publisher=None, batch_size: int = 500) -> int:
+    """
+    Libère les réservations dont `expires_at` est dépassé et publie les
+    événements de stock si un `publisher` est fourni. Retourne le nombre de
+    réservations libérées.
+    """
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    released = 0
+    while True:
+        reservation_ids = db.execute(
+            select(StockReservation.id)
+            .where(StockReservation.expires_at <= now)
+            .order_by(StockReservation.expires_at)
+            .limit(batch_size)
+        ).scalars().all()
+        if not reservation_ids:
+            break
+
+        count, events = release_reservations(db, reservation_ids)
+        db.commit()
+        released += count
+        if publisher is not None:
+            publish_events(publisher, events)
+
+    return released
+
+
+def main():
+    publisher = get_publisher()
+    try:
+        with SessionLocal(bind=get_engine()) as db:
+            released = release_expired_reservations(db, publisher=publisher)
+    finally:
+        publisher.close()
+    logger.info("Réservations expirées libérées : %d", released)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
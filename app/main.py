@@ -1,17 +1,71 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from .routers import product
-from .config.database import Base, engine
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from .routers import product, reservation, stream
+from .routers.rabbitmq import get_publisher
+from .events.hub import get_event_hub
+from .config.database import Base, get_engine
+from .config.settings import AUTH_ENABLED, RATE_LIMIT_ENABLED, STARTUP_PREWARM
+from .middelware.auth import get_token_verifier
+from .middelware.rate_limit import RateLimitMiddleware
+from .middelware.compression import CompressionMiddleware
+from .middelware.http_cache import HttpCacheMiddleware
 from prometheus_fastapi_instrumentator import Instrumentator
 
 
+logger = logging.getLogger(__name__)
+
+
+def prewarm():
+    """Crée l'engine et ouvre une première connexion du pool, charge pika."""
+    try:
+        with get_engine().connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except SQLAlchemyError as e:
+        # La base indisponible au démarrage ne doit pas empêcher le service de démarrer
+        logger.warning("Pré-chauffage de la base impossible : %s", e)
+    get_publisher().params
+
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if AUTH_ENABLED:
+        # Authentification mal configurée (ni SECRET_KEY ni JWKS_URL) : refus de démarrer
+        get_token_verifier()
+    # Clients DB et RabbitMQ créés à la première requête, ou ici si STARTUP_PREWARM :
+    # par défaut le service est prêt sans avoir chargé le driver ni pika
+    if STARTUP_PREWARM:
+        await asyncio.to_thread(prewarm)
+    yield
+    if get_event_hub.cache_info().currsize:
+        get_event_hub().close()
+    if get_publisher.cache_info().currsize:
+        get_publisher().close()
+    if get_engine.cache_info().currsize:
+        get_engine().dispose()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 # Ne plus exécuter create_all ici automatiquement
-# Base.metadata.create_all(bind=engine)
+# Base.metadata.create_all(bind=get_engine())
 
+# Avant le router produits : /products/stream et /products/ws précèdent /products/{product_id}
+app.include_router(stream.router, prefix="/api")
 app.include_router(product.router, prefix="/api")
+app.include_router(reservation.router, prefix="/api")
+
+# Le dernier middleware ajouté est le plus externe :
+# limitation de débit -> cache HTTP -> compression -> routers
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(HttpCacheMiddleware)
+
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware)
 
 instrumentator = Instrumentator(
     should_group_status_codes=True,
@@ -1,16 +1,245 @@
-# from fastapi import Depends, HTTPException, status
-# from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-# import jwt
-# from ..config.settings import SECRET_KEY, ALGORITHM
-
-# security = HTTPBearer()
-
-# def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-#     token = credentials.credentials
-#     try:
-#         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-#         return payload
-#     except jwt.ExpiredSignatureError:
-#         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token expiré")
-#     except jwt.InvalidTokenError:
-#         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token invalide")
+import json
+import logging
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Optional
+
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from starlette.concurrency import run_in_threadpool
+from jwt import JWT, JWKSet
+from jwt.exceptions import JWTException
+from jwt.jwk import AbstractJWKBase, OctetJWK
+from jwt.utils import b64decode
+
+from ..config.settings import (
+    SECRET_KEY,
+    ALGORITHM,
+    AUTH_ENABLED,
+    JWKS_URL,
+    JWKS_CACHE_SECONDS,
+    TOKEN_CACHE_SIZE,
+    TOKEN_CACHE_MAX_TTL,
+)
+from .routing import get_bearer_token
+
+logger = logging.getLogger(__name__)
+
+security = HTTPBearer(auto_error=False)
+
+# Clé de `scope["state"]` : (jeton, claims, erreur) de la requête
+VERIFIED_TOKEN_STATE = "verified_token"
+
+# Message de python-jwt pour un exp dépassé
+JWT_EXPIRED_MESSAGE = "JWT Expired"
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def fetch_jwks(url: str) -> dict:
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return json.loads(response.read())
+
+
+class JWKSCache:
+    """
+    Clés publiques (JWKS) du fournisseur d'identité, mises en cache localement.
+
+    Le jeu de clés est rechargé à expiration, ou plus tôt quand un jeton porte un
+    `kid` inconnu (rotation des clés), au plus une fois par `min_refresh_interval`.
+    En cas d'échec du rechargement, les clés déjà connues restent utilisées.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        ttl_seconds: int = JWKS_CACHE_SECONDS,
+        min_refresh_interval: float = 30,
+        fetch: Callable[[str], dict] = fetch_jwks,
+    ):
+        self.url = url
+        self.ttl = ttl_seconds
+        self.min_refresh_interval = min_refresh_interval
+        self.fetch = fetch
+        self._keys = {}
+        self._fetched_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def get_key(self, kid: Optional[str]) -> AbstractJWKBase:
+        now = time.monotonic()
+        if now - self._fetched_at >= self.ttl:
+            self._refresh(now)
+
+        key = self._keys.get(kid)
+        if key is None and now - self._fetched_at >= self.min_refresh_interval:
+            self._refresh(now)
+            key = self._keys.get(kid)
+        if key is None:
+            raise InvalidToken("Clé de signature inconnue")
+        return key
+
+    def _refresh(self, now: float) -> None:
+        with self._lock:
+            if now - self._fetched_at < self.min_refresh_interval and self._keys:
+                # Déjà rechargé par un autre thread
+                return
+            try:
+                keys = JWKSet.from_dict(self.fetch(self.url))
+            except Exception:
+                logger.exception("Impossible de récupérer le JWKS %s", self.url)
+                if not self._keys:
+                    raise InvalidToken("Clés de signature indisponibles")
+                return
+            finally:
+                self._fetched_at = now
+            self._keys = {key.get_kid(): key for key in keys}
+
+
+class TokenVerifier:
+    """
+    Vérification des jetons JWT avec un LRU borné des claims déjà vérifiés.
+
+    Un jeton en cache est servi sans recalculer la signature jusqu'à son `exp`
+    (ou au plus `max_ttl` secondes pour un jeton sans expiration).
+    """
+
+    def __init__(
+        self,
+        key: Optional[AbstractJWKBase] = None,
+        algorithms=("HS256",),
+        jwks: Optional[JWKSCache] = None,
+        cache_size: int = TOKEN_CACHE_SIZE,
+        max_ttl: int = TOKEN_CACHE_MAX_TTL,
+    ):
+        if jwks is None and (key is None or getattr(key, "key", None) == b""):
+            # Une clé HMAC vide permettrait de forger n'importe quel jeton
+            raise ValueError("Clé de vérification des jetons manquante")
+        self.key = key
+        self.algorithms = set(algorithms)
+        self.jwks = jwks
+        self.cache_size = cache_size
+        self.max_ttl = max_ttl
+        self._jwt = JWT()
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def verify(self, token: str) -> dict:
+        now = time.time()
+        claims = self.cached_claims(token, now)
+        if claims is not None:
+            return claims
+
+        claims = self._decode(token)
+        expires_at = now + self.max_ttl
+        if isinstance(claims.get("exp"), int):
+            expires_at = min(expires_at, claims["exp"])
+
+        with self._lock:
+            self._cache[token] = (claims, expires_at)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return claims
+
+    def cached_claims(self, token: str, now: Optional[float] = None) -> Optional[dict]:
+        """Claims d'un jeton déjà vérifié et encore valide, sans calcul ni E/S."""
+        now = time.time() if now is None else now
+        with self._lock:
+            cached = self._cache.get(token)
+            if cached is None:
+                return None
+            claims, expires_at = cached
+            if now < expires_at:
+                self._cache.move_to_end(token)
+                return claims
+            del self._cache[token]
+            return None
+
+    def _decode(self, token: str) -> dict:
+        try:
+            if self.jwks is not None:
+                header = json.loads(b64decode(token.split(".", 1)[0]))
+                key = self.jwks.get_key(header.get("kid"))
+            else:
+                key = self.key
+            return self._jwt.decode(token, key, algorithms=self.algorithms)
+        except JWTException as e:
+            # Message exact : python-jwt lève "Invalid Expired value" pour un exp mal formé
+            if str(e) == JWT_EXPIRED_MESSAGE:
+                raise InvalidToken("Token expiré") from e
+            raise InvalidToken("Token invalide") from e
+        except (ValueError, KeyError, AttributeError) as e:
+            raise InvalidToken("Token invalide") from e
+
+
+@lru_cache
+def get_token_verifier() -> TokenVerifier:
+    """
+    Vérificateur configuré. Sans JWKS_URL ni SECRET_KEY, lève RuntimeError plutôt
+    que d'accepter des jetons signés avec une clé vide (appelé au démarrage si
+    AUTH_ENABLED : le service refuse alors de démarrer).
+    """
+    if JWKS_URL:
+        return TokenVerifier(algorithms={ALGORITHM or "RS256"}, jwks=JWKSCache(JWKS_URL))
+    if not SECRET_KEY:
+        raise RuntimeError("AUTH_ENABLED exige SECRET_KEY ou JWKS_URL")
+    return TokenVerifier(OctetJWK(SECRET_KEY.encode()), algorithms={ALGORITHM or "HS256"})
+
+
+def get_auth_verifier() -> Optional[TokenVerifier]:
+    """Vérificateur des routes protégées, None si l'authentification est désactivée."""
+    return get_token_verifier() if AUTH_ENABLED else None
+
+
+async def verify_request_token(
+    scope,
+    token: Optional[str] = None,
+    verifier: Optional[TokenVerifier] = None,
+) -> dict:
+    """
+    Vérifie le jeton de la requête (par défaut celui de l'en-tête `Authorization`)
+    une seule fois : le résultat est mémorisé dans `scope["state"]` et réutilisé
+    par la limitation de débit, le cache HTTP et `verify_token`.
+
+    Un jeton déjà en cache est servi directement ; sinon la vérification a lieu
+    hors de la boucle asyncio (un rechargement JWKS fait un appel HTTP bloquant).
+    Lève InvalidToken si le jeton est absent ou invalide.
+    """
+    token = token or get_bearer_token(scope)
+    if not token:
+        raise InvalidToken("Token manquant")
+
+    state = scope.setdefault("state", {})
+    verified = state.get(VERIFIED_TOKEN_STATE)
+    if verified is None or verified[0] != token:
+        verifier = verifier or get_token_verifier()
+        try:
+            claims = verifier.cached_claims(token) or await run_in_threadpool(verifier.verify, token)
+            verified = (token, claims, None)
+        except InvalidToken as e:
+            verified = (token, None, e)
+        state[VERIFIED_TOKEN_STATE] = verified
+
+    _, claims, error = verified
+    if error is not None:
+        raise error
+    return claims
+
+
+async def verify_token(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    verifier: Optional[TokenVerifier] = Depends(get_auth_verifier),
+):
+    if not AUTH_ENABLED:
+        return None
+    if credentials is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token manquant")
+    try:
+        return await verify_request_token(request.scope, credentials.credentials, verifier)
+    except InvalidToken as e:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e))
@@ -0,0 +1,151 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from starlette.datastructures import MutableHeaders
+
+from ..config.settings import (
+    AUTH_ENABLED,
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_TTL,
+    RESPONSE_CACHE_MAX_ENTRIES,
+)
+from .auth import InvalidToken, verify_request_token
+from .compression import negotiate_encoding
+from .routing import route_template, get_header
+
+# En-tête Cache-Control par route ; les écritures ne sont jamais mises en cache
+CACHE_POLICIES = {
+    "GET /api/products/": "max-age=5",
+    "GET /api/products/{product_id}": "max-age=10",
+}
+NO_STORE = "no-store"
+
+# Routes dont la réponse encodée (JSON compressé) est conservée en mémoire
+CACHED_ROUTES = {"GET /api/products/"}
+
+
+class ResponseCache:
+    """
+    Cache LRU des réponses encodées, propre à chaque worker.
+
+    `invalidate()` est appelé par les endpoints d'écriture ; une réponse calculée
+    pendant une écriture n'est pas conservée (compteur de génération). Entre
+    workers, la fraîcheur est bornée par le TTL.
+    """
+
+    def __init__(self, ttl: float = RESPONSE_CACHE_TTL, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[tuple]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, response = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return response
+
+    def set(self, key, response: tuple, generation: int) -> None:
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, response)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+
+response_cache = ResponseCache()
+
+
+class HttpCacheMiddleware:
+    """
+    Ajoute l'en-tête Cache-Control de la route et sert les pages de liste
+    depuis `response_cache`. À placer autour de CompressionMiddleware pour
+    conserver les corps déjà compressés (la clé inclut l'encodage négocié).
+    """
+
+    def __init__(
+        self,
+        app,
+        policies: dict = CACHE_POLICIES,
+        cached_routes: set = CACHED_ROUTES,
+        cache: ResponseCache = response_cache,
+        enabled: bool = RESPONSE_CACHE_ENABLED,
+    ):
+        self.app = app
+        self.policies = policies
+        self.cached_routes = cached_routes
+        self.cache = cache
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = f"{method} {route_template(scope)}"
+        policy = self.policies.get(route, NO_STORE if method not in ("GET", "HEAD") else None)
+
+        key = None
+        if self.enabled and route in self.cached_routes and await self._authorized(scope):
+            key = (scope["path"], scope["query_string"], negotiate_encoding(get_header(scope, b"accept-encoding")))
+            cached = self.cache.get(key)
+            if cached is not None:
+                status, headers, body = cached
+                await send({"type": "http.response.start", "status": status, "headers": headers})
+                await send({"type": "http.response.body", "body": body})
+                return
+        generation = self.cache.generation
+
+        captured = {}
+
+        async def send_with_policy(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message["headers"])
+                if policy and "cache-control" not in headers:
+                    headers["Cache-Control"] = policy
+                captured["start"] = message
+            elif key is not None:
+                captured.setdefault("body", []).append(message)
+            await send(message)
+
+        await self.app(scope, receive, send_with_policy)
+
+        body_messages = captured.get("body", [])
+        start = captured.get("start")
+        if (
+            key is not None
+            and start is not None
+            and start["status"] == 200
+            and len(body_messages) == 1
+            and not body_messages[0].get("more_body", False)
+        ):
+            self.cache.set(key, (start["status"], list(start["headers"]), body_messages[0].get("body", b"")), generation)
+
+    @staticmethod
+    async def _authorized(scope) -> bool:
+        # Une réponse en cache ne doit pas contourner l'authentification
+        if not AUTH_ENABLED:
+            return True
+        try:
+            # Vérification partagée avec la limitation de débit et verify_token
+            await verify_request_token(scope)
+        except InvalidToken:
+            return False
+        return True
@@ -0,0 +1,246 @@
+import hashlib
+import itertools
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import Depends, Header, HTTPException, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..config.database import get_db
+from ..config.settings import IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_LOCK_SECONDS
+from ..models.idempotency import IdempotencyKey
+
+# Purge des clés expirées toutes les N réservations en base
+PURGE_EVERY = 100
+_reservations = itertools.count(1)
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+@dataclass
+class IdempotencyRecord:
+    fingerprint: str
+    expires_at: datetime
+    status_code: Optional[int] = None
+    response_body: Optional[str] = None
+    locked_until: Optional[datetime] = None
+
+    @property
+    def completed(self) -> bool:
+        return self.status_code is not None
+
+    def lock_expired(self, now: datetime) -> bool:
+        return not self.completed and self.locked_until is not None and self.locked_until <= now
+
+
+class InMemoryIdempotencyStore:
+    """
+    Store en mémoire (tests, instance unique). Les clés expirent dans l'ordre
+    d'insertion, la purge se fait donc en tête de dictionnaire.
+    """
+
+    def __init__(self, ttl_seconds: int = IDEMPOTENCY_TTL_SECONDS, lock_seconds: int = IDEMPOTENCY_LOCK_SECONDS):
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.lock = timedelta(seconds=lock_seconds)
+        self._records = OrderedDict()
+        self._lock = threading.Lock()
+
+    def reserve(self, key: str, fingerprint: str) -> Optional[IdempotencyRecord]:
+        """
+        Réserve la clé ; retourne l'enregistrement existant si elle est déjà prise.
+        Une clé en cours dont le bail a expiré est reprise par la même requête.
+        """
+        with self._lock:
+            self._purge_expired()
+            now = utcnow()
+            existing = self._records.get(key)
+            if existing is not None:
+                if existing.lock_expired(now) and existing.fingerprint == fingerprint:
+                    existing.locked_until = now + self.lock
+                    return None
+                return existing
+            self._records[key] = IdempotencyRecord(fingerprint, now + self.ttl, locked_until=now + self.lock)
+            return None
+
+    def complete(self, key: str, status_code: int, response_body: str) -> None:
+        with self._lock:
+            record = self._records.get(key)
+            if record is not None:
+                record.status_code = status_code
+                record.response_body = response_body
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            record = self._records.get(key)
+            if record is not None and not record.completed:
+                del self._records[key]
+
+    def _purge_expired(self) -> None:
+        now = utcnow()
+        while self._records:
+            key, record = next(iter(self._records.items()))
+            if record.expires_at > now:
+                break
+            del self._records[key]
+
+
+class DatabaseIdempotencyStore:
+    """Store persistant : table `idempotency_keys`, partagée par toutes les instances."""
+
+    def __init__(self, db: Session, ttl_seconds: int = IDEMPOTENCY_TTL_SECONDS, lock_seconds: int = IDEMPOTENCY_LOCK_SECONDS):
+        self.db = db
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.lock = timedelta(seconds=lock_seconds)
+
+    def reserve(self, key: str, fingerprint: str) -> Optional[IdempotencyRecord]:
+        if next(_reservations) % PURGE_EVERY == 0:
+            self.purge_expired()
+
+        now = utcnow()
+        existing = self.db.get(IdempotencyKey, key)
+        if existing is not None and existing.expires_at <= now:
+            self.db.delete(existing)
+            self.db.commit()
+            existing = None
+
+        if existing is None:
+            try:
+                self.db.add(IdempotencyKey(
+                    key=key,
+                    fingerprint=fingerprint,
+                    expires_at=now + self.ttl,
+                    locked_until=now + self.lock
+                ))
+                self.db.commit()
+                return None
+            except IntegrityError:
+                # Requête concurrente avec la même clé
+                self.db.rollback()
+                existing = self.db.get(IdempotencyKey, key)
+                if existing is None:
+                    return self.reserve(key, fingerprint)
+
+        record = IdempotencyRecord(
+            fingerprint=existing.fingerprint,
+            expires_at=existing.expires_at,
+            status_code=existing.status_code,
+            response_body=existing.response_body,
+            locked_until=existing.locked_until,
+        )
+        if record.lock_expired(now) and record.fingerprint == fingerprint and self._take_over(key, now):
+            return None
+        return record
+
+    def _take_over(self, key: str, now: datetime) -> bool:
+        """Reprend une clé abandonnée ; une seule requête concurrente y parvient."""
+        taken = self.db.query(IdempotencyKey).filter(
+            IdempotencyKey.key == key,
+            IdempotencyKey.status_code.is_(None),
+            IdempotencyKey.locked_until <= now
+        ).update({"locked_until": now + self.lock}, synchronize_session=False)
+        self.db.commit()
+        return taken == 1
+
+    def complete(self, key: str, status_code: int, response_body: str) -> None:
+        """Sans commit : la réponse est validée par la transaction de l'endpoint."""
+        self.db.query(IdempotencyKey).filter(IdempotencyKey.key == key).update(
+            {"status_code": status_code, "response_body": response_body}
+        )
+
+    def release(self, key: str) -> None:
+        self.db.rollback()
+        # Une réponse déjà validée est conservée : une nouvelle tentative la rejoue
+        self.db.query(IdempotencyKey).filter(
+            IdempotencyKey.key == key,
+            IdempotencyKey.status_code.is_(None)
+        ).delete()
+        self.db.commit()
+
+    def purge_expired(self) -> int:
+        deleted = self.db.query(IdempotencyKey).filter(IdempotencyKey.expires_at <= utcnow()).delete()
+        self.db.commit()
+        return deleted
+
+
+def get_idempotency_store(db: Session = Depends(get_db)):
+    return DatabaseIdempotencyStore(db)
+
+
+class Idempotency:
+    """
+    Gestion de l'en-tête `Idempotency-Key` pour un appel d'endpoint.
+
+    `begin()` retourne la réponse mémorisée si la requête a déjà abouti ; sinon la
+    clé est réservée et l'endpoint appelle `complete()` avec sa réponse, avant le
+    commit de son écriture : la réponse et l'écriture sont validées ensemble.
+    """
+
+    def __init__(self, store, key: Optional[str], method: str, path: str):
+        self.store = store
+        self.key = f"{method} {path} {key}" if key else None
+        self.method = method
+        self.path = path
+        self.reserved = False
+        self.completed = False
+
+    def begin(self, payload: BaseModel) -> Optional[Response]:
+        if self.key is None:
+            return None
+
+        fingerprint = hashlib.sha256(
+            f"{self.method} {self.path} ".encode() + payload.model_dump_json().encode()
+        ).hexdigest()
+        record = self.store.reserve(self.key, fingerprint)
+        if record is None:
+            self.reserved = True
+            return None
+
+        if record.fingerprint != fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Clé d'idempotence déjà utilisée pour une autre requête"
+            )
+        if not record.completed:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Une requête avec cette clé d'idempotence est en cours de traitement"
+            )
+        return Response(
+            content=record.response_body,
+            status_code=record.status_code,
+            media_type="application/json",
+            headers={"Idempotent-Replayed": "true"},
+        )
+
+    def complete(self, status_code: int, response) -> None:
+        if not self.reserved:
+            return
+        self.store.complete(self.key, status_code, json.dumps(jsonable_encoder(response)))
+        self.completed = True
+
+
+def idempotency(
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    store=Depends(get_idempotency_store),
+):
+    guard = Idempotency(store, idempotency_key, request.method, request.url.path)
+    try:
+        yield guard
+    except Exception:
+        # Échec de l'endpoint, éventuellement après complete() si le commit a échoué :
+        # la clé est libérée pour permettre une nouvelle tentative
+        if guard.reserved:
+            store.release(guard.key)
+        raise
+    if guard.reserved and not guard.completed:
+        store.release(guard.key)
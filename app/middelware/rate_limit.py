@@ -0,0 +1,184 @@
+import json
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from prometheus_client import Counter, Gauge
+from starlette import status
+
+from ..config.database import pool_wait_monitor
+from ..config.settings import (
+    RATE_LIMIT_PER_SECOND,
+    RATE_LIMIT_BURST,
+    LOAD_SHED_WAIT_THRESHOLD_MS,
+    LOAD_SHED_MIN_IN_FLIGHT,
+    LOAD_SHED_RETRY_AFTER,
+    AUTH_ENABLED,
+    TRUSTED_PROXIES,
+)
+from .auth import InvalidToken, verify_request_token
+from .routing import route_template, get_header
+
+RATE_LIMITED = Counter(
+    "http_requests_rate_limited_total",
+    "Requêtes refusées (429) par la limitation de débit",
+    ["route"],
+)
+SHED = Counter(
+    "http_requests_shed_total",
+    "Requêtes refusées (503) par le délestage",
+)
+IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Requêtes HTTP en cours de traitement",
+)
+
+EXEMPT_PATHS = {"/metrics", "/docs", "/redoc", "/openapi.json"}
+
+# Connexions longues sans accès à la base : limitées à l'ouverture, mais ni
+# comptées dans les requêtes en cours ni délestées (de même que les WebSockets)
+STREAMING_ROUTES = {"GET /api/products/stream"}
+
+
+class TokenBucketLimiter:
+    """
+    Un token bucket par clé (client, route), conservés dans un LRU borné pour
+    que les clients inactifs ne fassent pas grossir la mémoire.
+    """
+
+    def __init__(self, rate: float, burst: int, max_buckets: int = 10_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()
+
+    def acquire(self, key, rate: Optional[float] = None, burst: Optional[int] = None) -> float:
+        """Consomme un jeton ; retourne 0 si accepté, sinon le délai d'attente en secondes."""
+        rate = rate or self.rate
+        burst = burst or self.burst
+        now = time.monotonic()
+
+        tokens, updated_at = self._buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated_at) * rate)
+        if tokens >= 1:
+            tokens -= 1
+            wait = 0.0
+        else:
+            wait = (1 - tokens) / rate
+
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class RateLimitMiddleware:
+    """
+    Middleware ASGI placé devant les routers :
+
+    - 429 + `Retry-After` quand un client dépasse son débit sur une route
+      (voir `_client_id`), fermeture 1013 pour une ouverture de WebSocket ;
+    - 503 + `Retry-After` quand l'attente moyenne sur le pool de connexions
+      dépasse le seuil et qu'au moins `min_in_flight` requêtes sont déjà en cours.
+
+    `route_limits` permet de surcharger (débit, burst) pour une route,
+    par exemple `{"POST /api/products/": (5, 10)}`.
+    """
+
+    def __init__(
+        self,
+        app,
+        rate: float = RATE_LIMIT_PER_SECOND,
+        burst: int = RATE_LIMIT_BURST,
+        route_limits: Optional[Dict[str, Tuple[float, int]]] = None,
+        wait_threshold_ms: float = LOAD_SHED_WAIT_THRESHOLD_MS,
+        min_in_flight: int = LOAD_SHED_MIN_IN_FLIGHT,
+        retry_after: int = LOAD_SHED_RETRY_AFTER,
+        monitor=pool_wait_monitor,
+        trusted_proxies: Iterable[str] = TRUSTED_PROXIES,
+    ):
+        self.app = app
+        self.limiter = TokenBucketLimiter(rate, burst)
+        self.route_limits = route_limits or {}
+        self.wait_threshold = wait_threshold_ms / 1000
+        self.min_in_flight = min_in_flight
+        self.retry_after = retry_after
+        self.monitor = monitor
+        self.trusted_proxies = frozenset(trusted_proxies)
+        self.in_flight = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket") or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        websocket = scope["type"] == "websocket"
+        route = f"{'WS' if websocket else scope['method']} {route_template(scope)}"
+        rate, burst = self.route_limits.get(route, (None, None))
+        wait = self.limiter.acquire((await self._client_id(scope), route), rate, burst)
+        if wait:
+            RATE_LIMITED.labels(route=route).inc()
+            if websocket:
+                # Poignée de main refusée (le serveur répond 403 avant l'upgrade)
+                await send({"type": "websocket.close", "code": status.WS_1013_TRY_AGAIN_LATER})
+            else:
+                await self._reject(send, 429, "Trop de requêtes", math.ceil(wait))
+            return
+
+        if websocket or route in STREAMING_ROUTES:
+            await self.app(scope, receive, send)
+            return
+
+        if self.in_flight >= self.min_in_flight and self.monitor.average > self.wait_threshold:
+            SHED.inc()
+            await self._reject(send, 503, "Service surchargé, réessayez plus tard", self.retry_after)
+            return
+
+        self.in_flight += 1
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+            IN_FLIGHT.dec()
+
+    async def _client_id(self, scope) -> str:
+        """
+        Sujet du jeton authentifié, sinon client désigné par un proxy de confiance
+        (`X-Client-Id`, puis dernière adresse de `X-Forwarded-For`), sinon adresse IP.
+        Les en-têtes envoyés directement par un client sont ignorés : il suffirait
+        d'en changer pour obtenir un nouveau bucket.
+        """
+        if AUTH_ENABLED:
+            try:
+                claims = await verify_request_token(scope)
+            except InvalidToken:
+                claims = {}
+            if claims.get("sub"):
+                return f"sub:{claims['sub']}"
+
+        client = scope.get("client")
+        address = client[0] if client else "inconnu"
+        if address in self.trusted_proxies:
+            client_id = get_header(scope, b"x-client-id")
+            if client_id:
+                return f"client:{client_id}"
+            forwarded = (get_header(scope, b"x-forwarded-for") or "").rsplit(",", 1)[-1].strip()
+            if forwarded:
+                return f"ip:{forwarded}"
+        return f"ip:{address}"
+
+    @staticmethod
+    async def _reject(send, status_code: int, detail: str, retry_after: int) -> None:
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,28 @@
+from starlette.routing import Match
+
+
+def route_template(scope) -> str:
+    """
+    Chemin déclaré de la route appelée : /api/products/1, /api/products/2...
+    sont regroupés sous /api/products/{product_id}.
+    """
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    # Chemins inconnus regroupés : évite une explosion des labels Prometheus
+    return "untemplated"
+
+
+def get_header(scope, name: bytes):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def get_bearer_token(scope):
+    scheme, _, token = (get_header(scope, b"authorization") or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    return token
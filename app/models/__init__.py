@@ -1,3 +1,6 @@
 # app/models/__init__.py
 from .product import Product
 from .price import Price
+from .idempotency import IdempotencyKey
+from .product_change import ProductChange
+from .reservation import StockReservation
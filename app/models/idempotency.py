@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime
+from ..config.database import Base
+from datetime import datetime, timezone
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String, primary_key=True)
+    # Empreinte (méthode, chemin, corps) de la requête ayant réservé la clé
+    fingerprint = Column(String, nullable=False)
+    # NULL tant que la requête d'origine est en cours de traitement
+    status_code = Column(Integer)
+    response_body = Column(Text)
+    # Fin du bail de la requête en cours : une clé non terminée au-delà peut être reprise
+    locked_until = Column(DateTime)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    expires_at = Column(DateTime, nullable=False, index=True)
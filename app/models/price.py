@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, Float, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from ..config.database import Base
 from datetime import datetime, timezone
@@ -13,3 +13,5 @@ class Price(Base):
 
     product = relationship("Product", back_populates="prices")
 
+# Lecture des prix d'un produit (du plus récent au plus ancien) et suppressions en cascade
+Index("ix_prices_product_id_created_at", Price.product_id, Price.created_at.desc())
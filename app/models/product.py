@@ -11,10 +11,22 @@ class Product(Base):
     name = Column(String, unique=True, nullable=False)
     description = Column(String)
     stock = Column(Integer, nullable=False)
+    # Incrémentée à chaque mise à jour : permet aux consommateurs d'ignorer les événements en double.
+    # Verrouillage optimiste : l'UPDATE de l'ORM porte `WHERE version = <version lue>`
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = Column(
+        DateTime,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc)
+    )
     prices = relationship(
         "Price",
         back_populates="product",
-        cascade="all, delete-orphan"
+        cascade="all, delete-orphan",
+        # Les prix sont supprimés par la base (ON DELETE CASCADE) sans être chargés
+        passive_deletes=True
     )
 
+    __mapper_args__ = {"version_id_col": version}
+
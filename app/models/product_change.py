@@ -0,0 +1,48 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from ..config.database import Base
+
+# Types de changement du flux GET /api/products/changes
+CHANGE_UPSERT = "upsert"
+CHANGE_DELETE = "delete"
+
+
+class clock_now(FunctionElement):
+    """
+    Heure courante de la base au moment de l'instruction. Sur PostgreSQL, now()
+    est l'heure de début de la transaction : une écriture restée en attente d'un
+    verrou insérerait une ligne déjà « stabilisée » au moment de son commit.
+    """
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(clock_now)
+def _compile_clock_now(element, compiler, **kw):
+    return "CURRENT_TIMESTAMP"
+
+
+@compiles(clock_now, "postgresql")
+def _compile_clock_now_postgresql(element, compiler, **kw):
+    return "clock_timestamp()"
+
+
+class ProductChange(Base):
+    __tablename__ = "product_changes"
+
+    # Ordre du flux de changements ; sert de jeton de reprise
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    # Pas de clé étrangère : la ligne de suppression (tombstone) survit au produit
+    product_id = Column(Integer, nullable=False)
+    op = Column(String, nullable=False)
+    # Version du produit après le changement
+    version = Column(Integer, nullable=False)
+    # Horloge de la base à l'insertion, comparée à la même horloge par le flux (pas celle de chaque instance).
+    # Indexée : la recherche des entrées non stabilisées ne parcourt que les plus récentes
+    changed_at = Column(DateTime, nullable=False, server_default=clock_now(), index=True)
+
+    __table_args__ = (
+        # Compaction : entrée plus récente du même produit
+        Index("ix_product_changes_product_id_seq", "product_id", "seq"),
+    )
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, ForeignKey, DateTime
+from ..config.database import Base
+from datetime import datetime, timezone
+
+class StockReservation(Base):
+    __tablename__ = "stock_reservations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False, index=True)
+    # Quantité retirée de products.stock tant que la réservation existe
+    quantity = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    # Au-delà, la réservation est libérée par app.jobs.reservation_expiry
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -1,12 +1,33 @@
 from fastapi import APIRouter, HTTPException, Depends, status, Body, Path, Query
 from sqlalchemy.orm import Session, joinedload
-from typing import List
+from typing import List, Optional
+from datetime import datetime, timedelta, timezone
 from ..config.database import get_db
 from ..models.product import Product as ProductModel
 from ..models.price import Price as PriceModel
-from ..config.schemas import ProductCreate, ProductResponse, PriceCreate, ProductUpdate
+from ..models.product_change import ProductChange as ProductChangeModel, CHANGE_UPSERT, CHANGE_DELETE, clock_now
+from ..config.schemas import (
+    ProductCreate,
+    ProductResponse,
+    PriceCreate,
+    ProductUpdate,
+    ProductChange,
+    ProductChangesResponse,
+)
+from sqlalchemy import func, select
 from sqlalchemy.exc import SQLAlchemyError
-from .rabbitmq import publish_product
+from sqlalchemy.orm.exc import StaleDataError
+from .rabbitmq import RabbitMQPublisher, get_publisher, publish_events
+from ..middelware.idempotency import Idempotency, idempotency
+from ..middelware.auth import verify_token
+from ..middelware.http_cache import response_cache
+from ..config.settings import MAX_PAGE_SIZE, CHANGE_FEED_SETTLE_SECONDS
+from ..events.envelope import (
+    product_snapshot,
+    product_created_event,
+    product_updated_event,
+    product_deleted_event,
+)
 
 
 
@@ -14,6 +35,7 @@ from .rabbitmq import publish_product
 router = APIRouter(
     prefix="/products",
     tags=["products"],
+    dependencies=[Depends(verify_token)],
     responses={
         404: {"description": "Produit non trouvé"},
         401: {"description": "Non autorisé"},
@@ -22,6 +44,16 @@ router = APIRouter(
 )
 
 
+def record_change(db: Session, product_id: int, op: str, version: int):
+    """
+    Ajoute l'entrée du flux de changements dans la transaction de l'écriture.
+
+    La ligne reçoit son `changed_at` au flush : l'appeler après les écritures
+    susceptibles d'attendre un verrou, pour que le délai de stabilisation ne
+    couvre que la fin de la transaction.
+    """
+    db.add(ProductChangeModel(product_id=product_id, op=op, version=version))
+
 
 @router.post(
     "/",
@@ -30,16 +62,26 @@ router = APIRouter(
     responses={
         201: {"description": "Produit créé avec succès"},
         400: {"description": "Données invalides"},
+        409: {"description": "Requête avec la même clé d'idempotence en cours"},
         422: {"description": "Erreur de validation"}
     }
 )
 def create_product(
     product_data: ProductCreate = Body(...),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idempotency: Idempotency = Depends(idempotency),
+    publisher: RabbitMQPublisher = Depends(get_publisher)
 ):
     """
     Crée un nouveau produit avec ses prix associés.
+
+    Avec un en-tête `Idempotency-Key`, une nouvelle tentative renvoie la réponse
+    d'origine sans recréer le produit ni republier l'événement.
     """
+    replayed = idempotency.begin(product_data)
+    if replayed is not None:
+        return replayed
+
     try:
         if not product_data.prices:
             raise HTTPException(
@@ -59,8 +101,8 @@ def create_product(
             stock=product_data.stock
         )
         db.add(db_product)
-        db.commit()
-        db.refresh(db_product)
+        # flush pour obtenir l'id : produit, prix et changement sont validés ensemble
+        db.flush()
 
         # Crée les prix
         for price in product_data.prices:
@@ -70,16 +112,23 @@ def create_product(
             )
             db.add(db_price)
 
-        db.commit()
-        db.refresh(db_product)
+        record_change(db, db_product.id, CHANGE_UPSERT, db_product.version)
+        db.flush()
 
         # On recharge le produit avec les prix
-        product_with_prices = db.query(ProductModel).options(joinedload(ProductModel.prices)).filter(ProductModel.id == db_product.id).first()
+        product_with_prices = db.query(ProductModel).options(joinedload(ProductModel.prices)).populate_existing().filter(ProductModel.id == db_product.id).first()
+        event = product_created_event(product_with_prices)
+        response = ProductResponse.model_validate(product_with_prices)
 
-        # Envoie le message à RabbitMQ
-        publish_product(ProductResponse.model_validate(product_with_prices).model_dump())
+        # La réponse mémorisée est validée avec le produit : une nouvelle tentative la rejoue
+        idempotency.complete(status.HTTP_201_CREATED, response)
+        db.commit()
 
-        return ProductResponse.model_validate(product_with_prices)
+        response_cache.invalidate()
+
+        # Envoie le message à RabbitMQ
+        publish_events(publisher, [event])
+        return response
 
     except SQLAlchemyError as e:
         db.rollback()
@@ -96,6 +145,85 @@ def create_product(
             detail=f"Erreur inattendue : {str(e)}"
         )
 
+@router.get(
+    "/changes",
+    response_model=ProductChangesResponse,
+    responses={
+        200: {"description": "Lot ordonné de changements et jeton de reprise"},
+        400: {"description": "Jeton de reprise invalide"}
+    }
+)
+def get_product_changes(
+    since: Optional[str] = Query(None, description="Jeton `next_since` du lot précédent (absent : depuis le début)"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE, description="Nombre maximum de changements à lire"),
+    db: Session = Depends(get_db)
+):
+    """
+    Flux de changements du catalogue pour la synchronisation incrémentale.
+
+    Retourne, dans l'ordre, les produits créés ou modifiés (`upsert`, avec leur
+    état courant) et supprimés (`delete`) depuis `since`. Un produit modifié
+    plusieurs fois dans le lot n'apparaît qu'une fois, à sa dernière position.
+    Relancer avec `next_since` tant que `has_more` est vrai.
+
+    Les suppressions sont conservées CHANGE_FEED_TOMBSTONE_RETENTION_DAYS jours
+    (voir `app.jobs.change_feed_compaction`) : au-delà, repartir du début.
+    """
+    try:
+        after = int(since) if since is not None else 0
+    except ValueError:
+        after = -1
+    if after < 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Jeton de reprise invalide"
+        )
+
+    # Un changement non encore stabilisé arrête le lot : ceux qui le suivent
+    # attendent, sinon le jeton de reprise le sauterait
+    db_now = db.scalar(select(clock_now()))
+    settled = db_now.replace(tzinfo=None) - timedelta(seconds=CHANGE_FEED_SETTLE_SECONDS)
+    first_unsettled = db.query(func.min(ProductChangeModel.seq))\
+        .filter(ProductChangeModel.seq > after, ProductChangeModel.changed_at > settled)\
+        .scalar()
+    query = db.query(ProductChangeModel).filter(ProductChangeModel.seq > after)
+    if first_unsettled is not None:
+        query = query.filter(ProductChangeModel.seq < first_unsettled)
+    entries = query.order_by(ProductChangeModel.seq).limit(limit).all()
+
+    # Seule la dernière entrée de chaque produit compte
+    latest = {entry.product_id: entry for entry in entries}
+    upserted = [entry.product_id for entry in latest.values() if entry.op == CHANGE_UPSERT]
+    products = {}
+    if upserted:
+        products = {
+            product.id: product
+            for product in db.query(ProductModel)
+                .options(joinedload(ProductModel.prices))
+                .filter(ProductModel.id.in_(upserted))
+        }
+
+    changes = []
+    for entry in sorted(latest.values(), key=lambda entry: entry.seq):
+        product = products.get(entry.product_id)
+        if entry.op == CHANGE_UPSERT and product is None:
+            # Supprimé depuis : la suppression figure plus loin dans le flux
+            continue
+        changes.append(ProductChange(
+            seq=entry.seq,
+            op=entry.op,
+            product_id=entry.product_id,
+            version=entry.version,
+            changed_at=entry.changed_at,
+            product=ProductResponse.model_validate(product) if entry.op == CHANGE_UPSERT else None,
+        ))
+
+    return ProductChangesResponse(
+        changes=changes,
+        next_since=str(entries[-1].seq if entries else after),
+        has_more=len(entries) == limit,
+    )
+
 @router.get(
     "/{product_id}",
     response_model=ProductResponse,
@@ -130,8 +258,8 @@ def get_product(
     response_description="Liste de tous les produits avec leurs prix"
 )
 def get_all_products(
-    skip: int = Query(0, description="Nombre d'éléments à sauter"),
-    limit: int = Query(100, description="Nombre maximum d'éléments à retourner"),
+    skip: int = Query(0, ge=0, description="Nombre d'éléments à sauter"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE, description="Nombre maximum d'éléments à retourner"),
     db: Session = Depends(get_db)
 ):
     """
@@ -151,17 +279,26 @@ def get_all_products(
     responses={
         200: {"description": "Produit mis à jour"},
         400: {"description": "Données invalides"},
-        404: {"description": "Produit non trouvé"}
+        404: {"description": "Produit non trouvé"},
+        409: {"description": "Requête avec la même clé d'idempotence en cours, ou produit modifié en parallèle"}
     }
 )
 def update_product(
     product_id: int = Path(..., description="ID du produit à mettre à jour"),
     product_data: ProductUpdate = Body(...),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idempotency: Idempotency = Depends(idempotency),
+    publisher: RabbitMQPublisher = Depends(get_publisher)
 ):
     """
     Met à jour un produit et/ou ses prix. Tous les anciens prix sont remplacés.
+
+    Accepte un en-tête `Idempotency-Key` (voir `create_product`).
     """
+    replayed = idempotency.begin(product_data)
+    if replayed is not None:
+        return replayed
+
     try:
         product = db.query(ProductModel)\
             .options(joinedload(ProductModel.prices))\
@@ -174,6 +311,7 @@ def update_product(
                 detail="Produit non trouvé"
             )
 
+        before = product_snapshot(product)
         update_data = product_data.dict(exclude_unset=True, exclude={"prices"})
         for field, value in update_data.items():
             setattr(product, field, value)
@@ -194,16 +332,34 @@ def update_product(
                 )
                 db.add(db_price)
 
-        db.commit()
-        db.refresh(product)
+        # Force l'UPDATE même si seuls les prix changent : la version est
+        # incrémentée par l'ORM, à condition qu'elle n'ait pas changé depuis la lecture
+        product.updated_at = datetime.now(timezone.utc)
+        db.flush()
+        record_change(db, product.id, CHANGE_UPSERT, product.version)
         # Recharge avec les prix mis à jour
-        product = db.query(ProductModel).options(joinedload(ProductModel.prices)).filter(ProductModel.id == product_id).first()
+        product = db.query(ProductModel)\
+            .options(joinedload(ProductModel.prices))\
+            .populate_existing()\
+            .filter(ProductModel.id == product_id)\
+            .first()
 
-        # Envoie à RabbitMQ
-        publish_product(ProductResponse.model_validate(product).model_dump())
+        # Envoie à RabbitMQ uniquement les champs modifiés
+        event = product_updated_event(product, before)
+        response = ProductResponse.model_validate(product)
+        idempotency.complete(status.HTTP_200_OK, response)
+        db.commit()
 
-        return ProductResponse.model_validate(product)
+        response_cache.invalidate()
+        publish_events(publisher, [event])
+        return response
 
+    except StaleDataError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Produit modifié en parallèle, réessayez"
+        )
     except SQLAlchemyError as e:
         db.rollback()
         raise HTTPException(
@@ -225,12 +381,14 @@ def update_product(
     responses={
         204: {"description": "Produit supprimé avec succès"},
         404: {"description": "Produit non trouvé"},
-        400: {"description": "Erreur lors de la suppression"}
+        400: {"description": "Erreur lors de la suppression"},
+        409: {"description": "Produit modifié en parallèle"}
     }
 )
 def delete_product(
     product_id: int = Path(..., description="ID du produit à supprimer"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    publisher: RabbitMQPublisher = Depends(get_publisher)
 ):
     """
     Supprime un produit spécifique et tous ses prix associés.
@@ -243,13 +401,25 @@ def delete_product(
             detail="Produit non trouvé"
         )
 
+    deleted_event = product_deleted_event(product_id, product.version + 1)
     try:
         db.query(PriceModel).filter(PriceModel.product_id == product_id).delete()
         db.delete(product)
+        db.flush()
+        record_change(db, product_id, CHANGE_DELETE, deleted_event.version)
         db.commit()
+    except StaleDataError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Produit modifié en parallèle, réessayez"
+        )
     except SQLAlchemyError as e:
         db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Erreur lors de la suppression : {str(e)}"
-        )
\ No newline at end of file
+        )
+
+    response_cache.invalidate()
+    publish_events(publisher, [deleted_event])
\ No newline at end of file
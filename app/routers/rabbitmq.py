@@ -1,27 +1,139 @@
+import logging
 import os
-import pika
-import json
+import threading
+from functools import lru_cache
+from typing import Iterable
 from dotenv import load_dotenv, find_dotenv
-from ..config.settings import RABBITMQ_URL
+from prometheus_client import Counter
+from ..config.settings import RABBITMQ_URL, EVENT_CONTENT_TYPE
+from ..config.rabbitmq import PRODUCTS_EXCHANGE
+from ..events.envelope import ProductEvent, encode_event, negotiate_content_type
+
+logger = logging.getLogger(__name__)
+
+PUBLISH_FAILURES = Counter(
+    "product_event_publish_failures_total",
+    "Événements produit validés en base mais non publiés sur RabbitMQ",
+)
 
 
 # # Charge automatiquement le premier .env
 # load_dotenv(find_dotenv())
 
 
-params = pika.URLParameters(RABBITMQ_URL)
+class RabbitMQPublisher:
+    """
+    Publie les événements produit sur l'exchange fanout.
+    Injecté dans les endpoints via `get_publisher` (remplaçable dans les tests).
+
+    pika et les paramètres de connexion ne sont chargés qu'au premier usage
+    (publication ou pré-chauffage au démarrage), jamais à l'import.
+
+    Une connexion et un canal sont ouverts par thread au premier événement puis
+    réutilisés (une `BlockingConnection` ne se partage pas entre threads).
+    Une connexion inactive ne traite pas les heartbeats : ils sont désactivés,
+    et la connexion est sondée avant chaque publication ; une connexion perdue
+    (proxy, redémarrage du broker) est rouverte sans perdre l'événement.
+    """
+
+    def __init__(self, url: str = RABBITMQ_URL, content_type: str = EVENT_CONTENT_TYPE):
+        self.url = url
+        self.content_type = negotiate_content_type(content_type)
+        self._params = None
+        self._local = threading.local()
+        self._connections = set()
+        self._lock = threading.Lock()
+
+    @property
+    def params(self):
+        if self._params is None:
+            import pika
+            params = pika.URLParameters(self.url)
+            # Personne ne répond aux heartbeats entre deux publications : le broker couperait la connexion
+            params.heartbeat = 0
+            self._params = params
+        return self._params
+
+    def publish(self, event: ProductEvent):
+        import pika
+
+        body = encode_event(event, self.content_type)
+        properties = pika.BasicProperties(
+            content_type=self.content_type,
+            type=event.event_type.value,
+            headers={"x-schema-version": event.schema_version},
+        )
+        try:
+            self._channel().basic_publish(exchange=PRODUCTS_EXCHANGE, routing_key="", body=body, properties=properties)
+        except pika.exceptions.AMQPError:
+            logger.warning("Connexion RabbitMQ perdue, reconnexion", exc_info=True)
+            self._discard()
+            self._channel().basic_publish(exchange=PRODUCTS_EXCHANGE, routing_key="", body=body, properties=properties)
+
+    def close(self) -> None:
+        """Ferme les connexions ouvertes (arrêt du service : plus aucune publication en cours)."""
+        with self._lock:
+            connections, self._connections = self._connections, set()
+        for connection in connections:
+            _close_quietly(connection)
+
+    def _channel(self):
+        import pika
+
+        channel = getattr(self._local, "channel", None)
+        if channel is not None and channel.is_open:
+            try:
+                # Sonde sans attente : détecte une connexion fermée pendant l'inactivité
+                self._local.connection.process_data_events(time_limit=0)
+                return channel
+            except pika.exceptions.AMQPError:
+                logger.debug("Connexion RabbitMQ inactive perdue, reconnexion", exc_info=True)
+        self._discard()
+
+        connection = pika.BlockingConnection(self.params)
+        channel = connection.channel()
+        channel.exchange_declare(exchange=PRODUCTS_EXCHANGE, exchange_type="fanout", durable=True)
+        self._local.connection, self._local.channel = connection, channel
+        with self._lock:
+            self._connections.add(connection)
+        return channel
+
+    def _discard(self) -> None:
+        connection = getattr(self._local, "connection", None)
+        self._local.connection = self._local.channel = None
+        if connection is not None:
+            with self._lock:
+                self._connections.discard(connection)
+            _close_quietly(connection)
+
+
+def _close_quietly(connection) -> None:
+    try:
+        if connection.is_open:
+            connection.close()
+    except Exception:
+        logger.debug("Fermeture de la connexion RabbitMQ impossible", exc_info=True)
+
+
+@lru_cache
+def get_publisher() -> RabbitMQPublisher:
+    return RabbitMQPublisher()
+
 
-# Fonction de publication : connexion établie à chaque appel
-def publish_product(product: dict):
-    # Crée une connexion et un canal à la demande
-    connection = pika.BlockingConnection(params)
-    channel = connection.channel()
-    channel.exchange_declare(exchange="produits", exchange_type="fanout", durable=True)
-    channel.basic_publish(
-        exchange="produits",
-        routing_key="",
-        body=json.dumps(product, default=str),
+def publish_events(publisher: RabbitMQPublisher, events: Iterable[ProductEvent]) -> None:
+    """
+    Publie les événements d'une écriture déjà validée.
 
-        properties=pika.BasicProperties(content_type='application/json')
-    )
-    connection.close()
+    Un échec du broker ne transforme pas la réponse en erreur : l'écriture est
+    faite et une nouvelle tentative la rejouerait. L'échec est journalisé et
+    compté ; les consommateurs rattrapent le changement via GET /api/products/changes.
+    """
+    for event in events:
+        try:
+            publisher.publish(event)
+        except Exception:
+            PUBLISH_FAILURES.inc()
+            logger.exception(
+                "Publication de %s (produit %s, version %s) impossible",
+                event.event_type.value, event.product_id, event.version
+            )
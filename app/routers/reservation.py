@@ -0,0 +1,295 @@
+from collections import defaultdict
+from datetime import timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Depends, status, Body, Path
+from sqlalchemy import delete, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from ..config.database import get_db
+from ..config.schemas import (
+    ReservationCreate,
+    BasketReservationCreate,
+    ReservationRelease,
+    BasketReservationRelease,
+    Reservation,
+)
+from ..config.settings import RESERVATION_TTL_SECONDS
+from ..events.envelope import ProductEvent, product_stock_event
+from ..middelware.auth import verify_token
+from ..middelware.http_cache import response_cache
+from ..middelware.idempotency import Idempotency, idempotency, utcnow
+from ..models.product import Product as ProductModel
+from ..models.product_change import CHANGE_UPSERT
+from ..models.reservation import StockReservation
+from .product import record_change
+from .rabbitmq import RabbitMQPublisher, get_publisher, publish_events
+
+
+router = APIRouter(
+    prefix="/products",
+    tags=["reservations"],
+    dependencies=[Depends(verify_token)],
+    responses={
+        404: {"description": "Produit ou réservation non trouvé"},
+        401: {"description": "Non autorisé"}
+    }
+)
+
+
+def _adjust_stock(db: Session, product_id: int, delta: int) -> Optional[Tuple[int, int]]:
+    """
+    Modifie le stock en une seule instruction conditionnelle (pas de lecture
+    préalable) et retourne (stock, version), ou None si le produit n'existe pas
+    ou si le stock est insuffisant pour un retrait.
+    """
+    statement = update(ProductModel).where(ProductModel.id == product_id)
+    if delta < 0:
+        statement = statement.where(ProductModel.stock >= -delta)
+    row = db.execute(
+        statement
+        .values(stock=ProductModel.stock + delta, version=ProductModel.version + 1)
+        .returning(ProductModel.stock, ProductModel.version)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if row is None:
+        return None
+    record_change(db, product_id, CHANGE_UPSERT, row.version)
+    return row.stock, row.version
+
+
+def reserve_stock(
+    db: Session,
+    quantities: Dict[int, int],
+    ttl_seconds: int,
+    before_commit: Optional[Callable[[List[Reservation]], None]] = None
+) -> Tuple[List[Reservation], List[ProductEvent]]:
+    """
+    Réserve toutes les quantités ou aucune (une transaction). Retourne les
+    réservations et les événements de stock à publier après le commit.
+
+    `before_commit` reçoit les réservations dans la transaction (réponse
+    d'idempotence validée avec le stock).
+    """
+    expires_at = utcnow() + timedelta(seconds=ttl_seconds)
+    reservations, events = [], []
+    try:
+        # Ordre croissant des IDs : deux paniers concurrents verrouillent les produits dans le même ordre
+        for product_id in sorted(quantities):
+            quantity = quantities[product_id]
+            adjusted = _adjust_stock(db, product_id, -quantity)
+            if adjusted is None:
+                exists = db.query(ProductModel.id).filter(ProductModel.id == product_id).first() is not None
+                db.rollback()
+                if not exists:
+                    raise HTTPException(
+                        status_code=status.HTTP_404_NOT_FOUND,
+                        detail=f"Produit {product_id} non trouvé"
+                    )
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f"Stock insuffisant pour le produit {product_id}"
+                )
+            stock, version = adjusted
+            reservation = StockReservation(product_id=product_id, quantity=quantity, expires_at=expires_at)
+            db.add(reservation)
+            reservations.append(reservation)
+            events.append(product_stock_event(product_id, version, stock))
+
+        db.flush()
+        response = [Reservation.model_validate(reservation) for reservation in reservations]
+        if before_commit is not None:
+            before_commit(response)
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Erreur de base de données : {str(e)}"
+        )
+    return response, events
+
+
+def release_reservations(
+    db: Session,
+    reservation_ids: Iterable[int],
+    product_id: Optional[int] = None
+) -> Tuple[int, List[ProductEvent]]:
+    """
+    Supprime les réservations et rend leur stock, sans commit.
+
+    La suppression renvoie les lignes effectivement supprimées : une réservation
+    libérée en même temps par l'API et par le job d'expiration n'est rendue qu'une fois.
+    """
+    statement = delete(StockReservation).where(StockReservation.id.in_(list(reservation_ids)))
+    if product_id is not None:
+        statement = statement.where(StockReservation.product_id == product_id)
+    released = db.execute(
+        statement
+        .returning(StockReservation.product_id, StockReservation.quantity)
+        .execution_options(synchronize_session=False)
+    ).all()
+
+    quantities = defaultdict(int)
+    for released_product_id, quantity in released:
+        quantities[released_product_id] += quantity
+
+    events = []
+    for released_product_id in sorted(quantities):
+        adjusted = _adjust_stock(db, released_product_id, quantities[released_product_id])
+        if adjusted is not None:
+            stock, version = adjusted
+            events.append(product_stock_event(released_product_id, version, stock))
+    return len(released), events
+
+
+def _publish(publisher: RabbitMQPublisher, events: List[ProductEvent]) -> None:
+    # Après le commit : un échec du broker ne rend pas la réservation en erreur
+    response_cache.invalidate()
+    publish_events(publisher, events)
+
+
+@router.post(
+    "/reserve",
+    response_model=List[Reservation],
+    status_code=status.HTTP_201_CREATED,
+    responses={
+        201: {"description": "Panier réservé"},
+        409: {"description": "Stock insuffisant pour au moins un produit (rien n'est réservé)"}
+    }
+)
+def reserve_basket(
+    basket: BasketReservationCreate = Body(...),
+    db: Session = Depends(get_db),
+    idempotency: Idempotency = Depends(idempotency),
+    publisher: RabbitMQPublisher = Depends(get_publisher)
+):
+    """
+    Réserve tous les articles d'un panier, ou aucun si un stock est insuffisant.
+    Accepte un en-tête `Idempotency-Key`.
+    """
+    replayed = idempotency.begin(basket)
+    if replayed is not None:
+        return replayed
+
+    quantities = defaultdict(int)
+    for item in basket.items:
+        quantities[item.product_id] += item.quantity
+    reservations, events = reserve_stock(
+        db,
+        quantities,
+        basket.ttl_seconds or RESERVATION_TTL_SECONDS,
+        lambda reservations: idempotency.complete(status.HTTP_201_CREATED, reservations)
+    )
+
+    _publish(publisher, events)
+    return reservations
+
+
+@router.post(
+    "/release",
+    status_code=status.HTTP_204_NO_CONTENT,
+    responses={
+        204: {"description": "Réservations libérées"},
+        404: {"description": "Au moins une réservation est introuvable ou expirée (rien n'est libéré)"}
+    }
+)
+def release_basket(
+    release: BasketReservationRelease = Body(...),
+    db: Session = Depends(get_db),
+    publisher: RabbitMQPublisher = Depends(get_publisher)
+):
+    """
+    Libère les réservations d'un panier et rend le stock.
+    """
+    reservation_ids = set(release.reservation_ids)
+    try:
+        released, events = release_reservations(db, reservation_ids)
+        if released != len(reservation_ids):
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Réservation introuvable ou expirée"
+            )
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Erreur de base de données : {str(e)}"
+        )
+
+    _publish(publisher, events)
+
+
+@router.post(
+    "/{product_id}/reserve",
+    response_model=Reservation,
+    status_code=status.HTTP_201_CREATED,
+    responses={
+        201: {"description": "Stock réservé"},
+        409: {"description": "Stock insuffisant"}
+    }
+)
+def reserve_product(
+    product_id: int = Path(..., description="ID du produit à réserver"),
+    reservation_data: ReservationCreate = Body(...),
+    db: Session = Depends(get_db),
+    idempotency: Idempotency = Depends(idempotency),
+    publisher: RabbitMQPublisher = Depends(get_publisher)
+):
+    """
+    Retire `quantity` du stock si elle est disponible (`stock >= quantity`) et
+    crée une réservation, libérée automatiquement après `ttl_seconds`.
+
+    Accepte un en-tête `Idempotency-Key` (voir `create_product`).
+    """
+    replayed = idempotency.begin(reservation_data)
+    if replayed is not None:
+        return replayed
+
+    reservations, events = reserve_stock(
+        db,
+        {product_id: reservation_data.quantity},
+        reservation_data.ttl_seconds or RESERVATION_TTL_SECONDS,
+        lambda reservations: idempotency.complete(status.HTTP_201_CREATED, reservations[0])
+    )
+
+    _publish(publisher, events)
+    return reservations[0]
+
+
+@router.post(
+    "/{product_id}/release",
+    status_code=status.HTTP_204_NO_CONTENT,
+    responses={
+        204: {"description": "Réservation libérée"},
+        404: {"description": "Réservation introuvable ou expirée"}
+    }
+)
+def release_product(
+    product_id: int = Path(..., description="ID du produit réservé"),
+    release: ReservationRelease = Body(...),
+    db: Session = Depends(get_db),
+    publisher: RabbitMQPublisher = Depends(get_publisher)
+):
+    """
+    Libère une réservation du produit et rend le stock.
+    """
+    try:
+        released, events = release_reservations(db, [release.reservation_id], product_id)
+        if not released:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Réservation introuvable ou expirée"
+            )
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Erreur de base de données : {str(e)}"
+        )
+
+    _publish(publisher, events)
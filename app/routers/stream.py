@@ -0,0 +1,128 @@
+import asyncio
+import contextlib
+from typing import FrozenSet, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+
+from ..config.settings import AUTH_ENABLED, MAX_PAGE_SIZE, STREAM_KEEPALIVE_SECONDS
+from ..events.hub import EventHub, SubscriptionClosed, get_event_hub
+from ..middelware.auth import InvalidToken, verify_request_token, verify_token
+
+# Déclaré avant le router produits : /products/stream ne doit pas être pris pour /products/{product_id}
+router = APIRouter(
+    prefix="/products",
+    tags=["products"],
+)
+
+IDS_DESCRIPTION = "IDs de produits séparés par des virgules (absent : tous les produits)"
+
+# Code de fermeture WebSocket « réessayer plus tard » (abonné trop lent, arrêt du worker)
+WS_TRY_AGAIN_LATER = 1013
+
+
+def parse_product_ids(ids: Optional[str]) -> Optional[FrozenSet[int]]:
+    if not ids:
+        return None
+    product_ids = frozenset(int(part) for part in ids.split(",") if part.strip())
+    if len(product_ids) > MAX_PAGE_SIZE:
+        raise ValueError(f"Au plus {MAX_PAGE_SIZE} produits")
+    return product_ids or None
+
+
+@router.get(
+    "/stream",
+    dependencies=[Depends(verify_token)],
+    response_class=StreamingResponse,
+    responses={
+        200: {"description": "Flux text/event-stream des événements produit", "content": {"text/event-stream": {}}},
+        400: {"description": "Filtre d'IDs invalide"}
+    }
+)
+async def stream_products(
+    ids: Optional[str] = Query(None, description=IDS_DESCRIPTION),
+    hub: EventHub = Depends(get_event_hub)
+):
+    """
+    Server-Sent Events : un événement `product.created`, `product.updated` ou
+    `product.deleted` par changement, au format de l'enveloppe publiée sur RabbitMQ.
+
+    Un client trop lent reçoit l'événement `lagged` puis le flux se termine : il
+    doit se resynchroniser via GET /api/products/changes avant de se reconnecter.
+    """
+    try:
+        product_ids = parse_product_ids(ids)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Filtre d'IDs invalide"
+        )
+
+    async def frames():
+        with hub.subscribe(product_ids, transport="sse") as subscription:
+            # Premier octet immédiat : les en-têtes partent sans attendre un événement
+            yield b"retry: 3000\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscription.get(), STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                except SubscriptionClosed as e:
+                    yield f"event: {e.reason}\ndata: {{}}\n\n".encode()
+                    return
+                yield message.sse
+
+    return StreamingResponse(
+        frames(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/ws")
+async def product_websocket(
+    websocket: WebSocket,
+    ids: Optional[str] = Query(None, description=IDS_DESCRIPTION),
+    token: Optional[str] = Query(None, description="Jeton JWT (les navigateurs ne peuvent pas envoyer d'en-tête)"),
+    hub: EventHub = Depends(get_event_hub)
+):
+    """
+    WebSocket : un message texte JSON (enveloppe d'événement) par changement.
+    Fermeture 1013 si le client est trop lent ou si le worker s'arrête.
+    """
+    if AUTH_ENABLED:
+        try:
+            # Jeton de la query, sinon l'en-tête Authorization (déjà vérifié par la limitation de débit)
+            await verify_request_token(websocket.scope, token)
+        except InvalidToken:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Non autorisé")
+            return
+    try:
+        product_ids = parse_product_ids(ids)
+    except ValueError:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Filtre d'IDs invalide")
+        return
+
+    with hub.subscribe(product_ids, transport="websocket") as subscription:
+        await websocket.accept()
+        sender = asyncio.create_task(_send_events(websocket, subscription))
+        try:
+            # Les messages du client sont ignorés ; on attend seulement sa déconnexion
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+        finally:
+            sender.cancel()
+            # On attend la fin de l'envoi : pas de tâche orpheline ni d'exception perdue
+            with contextlib.suppress(asyncio.CancelledError, WebSocketDisconnect):
+                await sender
+
+
+async def _send_events(websocket: WebSocket, subscription) -> None:
+    while True:
+        try:
+            message = await subscription.get()
+        except SubscriptionClosed as e:
+            await websocket.close(code=WS_TRY_AGAIN_LATER, reason=e.reason)
+            return
+        await websocket.send_text(message.data)
@@ -0,0 +1,48 @@
+"""
+Coût de la vérification JWT par requête : vérification complète vs jeton en cache.
+
+Usage : python benchmarks/bench_auth.py
+"""
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt import JWT
+from jwt.jwk import OctetJWK, RSAJWK
+
+from app.middelware.auth import JWKSCache, TokenVerifier
+
+ITERATIONS = 20_000
+
+
+def report(label, verifier, token, number):
+    verifier.verify(token)
+    seconds = timeit.timeit(lambda: verifier.verify(token), number=number)
+    print(f"{label:<32} {seconds / number * 1e6:8.2f} µs/requête")
+
+
+def main():
+    exp = int(time.time()) + 3600
+
+    secret = OctetJWK(b"secret-de-benchmark")
+    hs_token = JWT().encode({"sub": "bench", "exp": exp}, secret, alg="HS256")
+    report("HS256 sans cache", TokenVerifier(secret, cache_size=0), hs_token, ITERATIONS // 10)
+    report("HS256 en cache", TokenVerifier(secret), hs_token, ITERATIONS)
+
+    private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwks = {"keys": [RSAJWK(private.public_key(), kid="bench").to_dict()]}
+    rs_token = JWT().encode({"sub": "bench", "exp": exp}, RSAJWK(private, kid="bench"), alg="RS256", optional_headers={"kid": "bench"})
+
+    def verifier(**options):
+        return TokenVerifier(algorithms={"RS256"}, jwks=JWKSCache("bench", fetch=lambda url: jwks), **options)
+
+    report("RS256 (JWKS) sans cache", verifier(cache_size=0), rs_token, ITERATIONS // 100)
+    report("RS256 (JWKS) en cache", verifier(), rs_token, ITERATIONS)
+
+
+if __name__ == "__main__":
+    main()
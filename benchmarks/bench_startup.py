@@ -0,0 +1,86 @@
+"""
+Démarrage à froid : profil d'import de `app.main` et délai jusqu'à la première réponse.
+
+Chaque mesure tourne dans un interpréteur neuf (aucun module déjà en cache).
+
+Usage : python benchmarks/bench_startup.py [--runs N] [--top N]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+FIRST_REQUEST = """
+import json, time
+start = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(app) as client:
+    ready = time.perf_counter()
+    client.get("/metrics")
+    answered = time.perf_counter()
+print(json.dumps({"import": imported - start, "lifespan": ready - imported, "first_request": answered - ready}))
+"""
+
+
+def run_python(code, *options):
+    env = dict(os.environ, STARTUP_PREWARM=os.environ.get("STARTUP_PREWARM", "false"))
+    return subprocess.run(
+        [sys.executable, *options, "-c", code],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+
+
+def import_profile(top):
+    """Temps d'import cumulé par paquet racine (sortie de `python -X importtime`)."""
+    stderr = run_python("import app.main", "-X", "importtime").stderr
+    by_package = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            self_us, _, name = line[len("import time:"):].split("|")
+            self_us = int(self_us)
+        except ValueError:
+            continue  # ligne d'en-tête
+        package = name.strip().split(".")[0]
+        by_package[package] += self_us
+
+    total = sum(by_package.values())
+    print(f"Import de app.main : {total / 1000:.0f} ms (temps propre cumulé)")
+    for package, us in sorted(by_package.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {package:<32} {us / 1000:8.1f} ms")
+
+
+def first_request(runs):
+    samples = defaultdict(list)
+    for _ in range(runs):
+        start = time.perf_counter()
+        timings = json.loads(run_python(FIRST_REQUEST).stdout.strip().splitlines()[-1])
+        samples["total (processus)"].append(time.perf_counter() - start)
+        for phase, seconds in timings.items():
+            samples[phase].append(seconds)
+
+    print(f"\nJusqu'à la première réponse (médiane sur {runs} démarrages) :")
+    for phase in ("import", "lifespan", "first_request", "total (processus)"):
+        print(f"  {phase:<32} {statistics.median(samples[phase]) * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+    import_profile(args.top)
+    first_request(args.runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,20 @@
+import asyncio
+
 import pytest
+from fastapi import status
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
 from app.main import app
 from app.config.database import Base, get_db
+from app.events.testing import InMemoryPublisher
+from app.middelware import auth
+from app.middelware.http_cache import response_cache
+from app.routers.rabbitmq import get_publisher
 
+# Base SQLite en mémoire : une par processus, donc isolée entre les workers pytest-xdist
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
 
 engine = create_engine(
@@ -14,33 +22,79 @@ engine = create_engine(
     connect_args={"check_same_thread": False},
     poolclass=StaticPool,
 )
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+
+# pysqlite gère mal les SAVEPOINT : on laisse SQLAlchemy émettre BEGIN lui-même
+@event.listens_for(engine, "connect")
+def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+
+
+@event.listens_for(engine, "begin")
+def _emit_begin(connection):
+    connection.exec_driver_sql("BEGIN")
+
 
-@pytest.fixture(scope="module")
+@pytest.fixture(scope="session")
 def test_db():
     Base.metadata.create_all(bind=engine)
     yield
     Base.metadata.drop_all(bind=engine)
 
-@pytest.fixture(scope="module")
+@pytest.fixture
 def db_session(test_db):
-    db = TestingSessionLocal()
+    """
+    Session dans une transaction annulée à la fin du test : les commits des
+    endpoints deviennent des SAVEPOINT, aucun état ne fuit vers le test suivant.
+    """
+    connection = engine.connect()
+    transaction = connection.begin()
+    db = TestingSessionLocal(bind=connection, join_transaction_mode="create_savepoint")
     try:
         yield db
     finally:
         db.close()
+        transaction.rollback()
+        connection.close()
+
+@pytest.fixture
+def publisher():
+    return InMemoryPublisher()
 
-@pytest.fixture(scope="module")
-def client(db_session):
+@pytest.fixture
+def client(request, db_session, publisher):
     def override_get_db():
-        try:
-            yield db_session
-        finally:
-            db_session.close()
+        yield db_session
 
     app.dependency_overrides[get_db] = override_get_db
-    with TestClient(app) as client:
+    app.dependency_overrides[get_publisher] = lambda: publisher
+    response_cache.invalidate()
+    # Une adresse client par test : les buckets de limitation de débit ne sont pas partagés
+    with TestClient(app, client=(request.node.nodeid, 50000)) as client:
         yield client
+    app.dependency_overrides.clear()
+    response_cache.invalidate()
+
+@pytest.fixture
+def create_product(client):
+    """Crée un produit via l'API et renvoie son ID."""
+    def create(name, stock=1, amount=1.0, **fields):
+        response = client.post("/api/products/", json={"name": name, "stock": stock, "prices": [{"amount": amount}], **fields})
+        assert response.status_code == status.HTTP_201_CREATED
+        return response.json()["id"]
+    return create
+
+class BrokenPublisher:
+    def publish(self, event):
+        raise ConnectionError("broker indisponible")
+
+@pytest.fixture
+def broken_publisher(client):
+    """Broker indisponible : chaque publication échoue."""
+    publisher = BrokenPublisher()
+    app.dependency_overrides[get_publisher] = lambda: publisher
+    return publisher
 
 @pytest.fixture
 def sample_product_data():
@@ -49,4 +103,28 @@ def sample_product_data():
         "description": "Test Description",
         "stock": 10,
         "prices": [{"amount": 19.99}]
-    }
\ No newline at end of file
+    }
+
+
+class RecordingVerifier:
+    """Vérificateur factice : note, pour chaque appel, s'il a lieu dans la boucle asyncio."""
+
+    def __init__(self):
+        self.in_event_loop = []
+
+    def cached_claims(self, token, now=None):
+        return None
+
+    def verify(self, token):
+        try:
+            asyncio.get_running_loop()
+            self.in_event_loop.append(True)
+        except RuntimeError:
+            self.in_event_loop.append(False)
+        return {"sub": "user-1"}
+
+@pytest.fixture
+def recording_verifier(monkeypatch):
+    verifier = RecordingVerifier()
+    monkeypatch.setattr(auth, "get_token_verifier", lambda: verifier)
+    return verifier
@@ -0,0 +1,125 @@
+import time
+
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import HTTPException, Request
+from fastapi.security import HTTPAuthorizationCredentials
+from jwt import JWT
+from jwt.jwk import OctetJWK, RSAJWK
+
+from app.middelware import auth
+from app.middelware.auth import InvalidToken, JWKSCache, TokenVerifier, verify_request_token, verify_token
+
+SECRET = OctetJWK(b"secret-de-test")
+
+
+def hs256_token(**claims):
+    return JWT().encode({"sub": "user-1", **claims}, SECRET, alg="HS256")
+
+
+def rsa_key(kid):
+    private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return RSAJWK(private, kid=kid), RSAJWK(private.public_key(), kid=kid)
+
+
+def test_verified_claims_are_cached(mocker):
+    verifier = TokenVerifier(SECRET)
+    decode = mocker.spy(verifier._jwt, "decode")
+    token = hs256_token(exp=int(time.time()) + 60)
+
+    assert verifier.verify(token)["sub"] == "user-1"
+    assert verifier.verify(token)["sub"] == "user-1"
+    assert decode.call_count == 1
+
+
+def test_cache_entry_does_not_outlive_exp(mocker):
+    verifier = TokenVerifier(SECRET)
+    decode = mocker.spy(verifier._jwt, "decode")
+    token = hs256_token(exp=int(time.time()) + 60)
+    verifier.verify(token)
+
+    mocker.patch.object(auth.time, "time", return_value=time.time() + 120)
+    verifier.verify(token)
+
+    # Entrée expirée : le jeton est de nouveau vérifié (et rejeté par jwt une fois exp atteint)
+    assert decode.call_count == 2
+
+
+def test_expired_token_is_rejected():
+    with pytest.raises(InvalidToken, match="expiré"):
+        TokenVerifier(SECRET).verify(hs256_token(exp=int(time.time()) - 1))
+
+
+
+def test_malformed_exp_is_invalid_not_expired():
+    with pytest.raises(InvalidToken, match="invalide"):
+        TokenVerifier(SECRET).verify(hs256_token(exp="demain"))
+
+def test_invalid_signature_is_rejected():
+    token = JWT().encode({"sub": "x"}, OctetJWK(b"autre-secret"), alg="HS256")
+
+    with pytest.raises(InvalidToken, match="invalide"):
+        TokenVerifier(SECRET).verify(token)
+
+
+def test_jwks_key_rotation():
+    old_private, old_public = rsa_key("v1")
+    new_private, new_public = rsa_key("v2")
+    published = {"keys": [old_public.to_dict()]}
+    fetches = []
+
+    def fetch(url):
+        fetches.append(url)
+        return published
+
+    verifier = TokenVerifier(algorithms={"RS256"}, jwks=JWKSCache("https://idp/jwks", min_refresh_interval=0, fetch=fetch))
+    assert verifier.verify(JWT().encode({"sub": "a"}, old_private, alg="RS256", optional_headers={"kid": "v1"}))["sub"] == "a"
+
+    # Le fournisseur publie une nouvelle clé : le kid inconnu déclenche un rechargement
+    published = {"keys": [old_public.to_dict(), new_public.to_dict()]}
+    token = JWT().encode({"sub": "b"}, new_private, alg="RS256", optional_headers={"kid": "v2"})
+    assert verifier.verify(token)["sub"] == "b"
+    assert len(fetches) == 2
+
+
+@pytest.mark.asyncio
+async def test_verify_token_dependency(monkeypatch):
+    monkeypatch.setattr(auth, "AUTH_ENABLED", True)
+    verifier = TokenVerifier(SECRET)
+    request = Request({"type": "http", "headers": []})
+
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=hs256_token())
+    assert (await verify_token(request, credentials, verifier))["sub"] == "user-1"
+
+    with pytest.raises(HTTPException) as error:
+        await verify_token(request, None, verifier)
+    assert error.value.status_code == 401
+
+
+def test_missing_secret_fails_closed(monkeypatch):
+    monkeypatch.setattr(auth, "JWKS_URL", None)
+    monkeypatch.setattr(auth, "SECRET_KEY", None)
+    auth.get_token_verifier.cache_clear()
+    try:
+        with pytest.raises(RuntimeError):
+            auth.get_token_verifier()
+    finally:
+        auth.get_token_verifier.cache_clear()
+
+    with pytest.raises(ValueError):
+        TokenVerifier(OctetJWK(b""))
+
+
+@pytest.mark.asyncio
+async def test_request_token_is_verified_once_per_request(mocker):
+    verifier = TokenVerifier(SECRET)
+    decode = mocker.spy(verifier._jwt, "decode")
+    token = hs256_token()
+    scope = {"type": "http", "headers": [(b"authorization", f"Bearer {token}".encode())]}
+
+    assert (await verify_request_token(scope, verifier=verifier))["sub"] == "user-1"
+    assert (await verify_request_token(scope, verifier=verifier))["sub"] == "user-1"
+    assert decode.call_count == 1
+
+    with pytest.raises(InvalidToken, match="manquant"):
+        await verify_request_token({"type": "http", "headers": []}, verifier=verifier)
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import status
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from app.jobs.change_feed_compaction import compact_product_changes
+from app.models.product_change import ProductChange, clock_now
+
+
+@pytest.fixture(autouse=True)
+def no_settle_delay(mocker):
+    mocker.patch("app.routers.product.CHANGE_FEED_SETTLE_SECONDS", 0)
+
+
+def test_changes_are_ordered_and_collapsed_per_product(client, create_product):
+    first = create_product("Feed A")
+    second = create_product("Feed B")
+    client.put(f"/api/products/{first}", json={"stock": 7})
+    client.delete(f"/api/products/{second}")
+
+    response = client.get("/api/products/changes")
+    assert response.status_code == status.HTTP_200_OK
+    body = response.json()
+    assert [(c["op"], c["product_id"], c["version"]) for c in body["changes"]] == [
+        ("upsert", first, 2),
+        ("delete", second, 2),
+    ]
+    assert body["changes"][0]["product"]["stock"] == 7
+    assert body["changes"][0]["product"]["updated_at"] is not None
+    assert body["changes"][1]["product"] is None
+    assert body["has_more"] is False
+
+
+def test_resume_token_pages_through_changes(client, create_product):
+    ids = [create_product(f"Feed page {i}") for i in range(3)]
+
+    seen, since = [], None
+    while True:
+        params = {"limit": 2} if since is None else {"limit": 2, "since": since}
+        body = client.get("/api/products/changes", params=params).json()
+        seen += [c["product_id"] for c in body["changes"]]
+        since = body["next_since"]
+        if not body["has_more"]:
+            break
+
+    assert seen == ids
+    assert client.get("/api/products/changes", params={"since": since}).json()["changes"] == []
+
+    client.put(f"/api/products/{ids[1]}", json={"stock": 3})
+    body = client.get("/api/products/changes", params={"since": since}).json()
+    assert [c["product_id"] for c in body["changes"]] == [ids[1]]
+
+
+def test_recent_changes_wait_for_settle_delay(client, create_product, mocker):
+    mocker.patch("app.routers.product.CHANGE_FEED_SETTLE_SECONDS", 60)
+    create_product("Feed recent")
+
+    body = client.get("/api/products/changes").json()
+    assert body["changes"] == []
+    assert body["next_since"] == "0"
+
+
+def test_unsettled_change_stops_the_batch(client, create_product, db_session):
+    early = create_product("Feed lent")
+    late = create_product("Feed rapide")
+    # La transaction d'`early` a obtenu le plus petit seq mais n'est pas encore stabilisée
+    db_session.query(ProductChange).filter(ProductChange.product_id == early).update(
+        {"changed_at": datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=1)}
+    )
+
+    body = client.get("/api/products/changes").json()
+    assert body["changes"] == []
+    assert body["next_since"] == "0"
+
+    db_session.query(ProductChange).filter(ProductChange.product_id == early).update(
+        {"changed_at": datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=1)}
+    )
+    body = client.get("/api/products/changes").json()
+    assert [c["product_id"] for c in body["changes"]] == [early, late]
+
+
+def test_compaction_keeps_the_feed_unchanged(client, create_product, db_session):
+    kept = create_product("Compacté")
+    for stock in (2, 3):
+        client.put(f"/api/products/{kept}", json={"stock": stock})
+    gone = create_product("Supprimé ancien")
+    client.delete(f"/api/products/{gone}")
+    before = client.get("/api/products/changes").json()["changes"]
+
+    assert compact_product_changes(db_session, batch_size=1) == 3
+    assert client.get("/api/products/changes").json()["changes"] == before
+
+    db_session.query(ProductChange).filter(ProductChange.product_id == gone).update(
+        {"changed_at": datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=31)}
+    )
+    assert compact_product_changes(db_session, tombstone_retention_days=30) == 1
+    assert [c["product_id"] for c in client.get("/api/products/changes").json()["changes"]] == [kept]
+
+
+def test_change_time_is_taken_at_insert_on_postgresql():
+    # now() y serait l'heure de début de la transaction, éventuellement restée en attente d'un verrou
+    assert "clock_timestamp()" in str(select(clock_now()).compile(dialect=postgresql.dialect()))
+
+
+@pytest.mark.parametrize("since", ["abc", "-1"])
+def test_invalid_resume_token_is_rejected(client, since):
+    response = client.get("/api/products/changes", params={"since": since})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,159 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.config.rabbitmq import dead_letter_queue_name
+from app.events.consumer import ProductEventConsumer
+from app.events.envelope import ProductEvent, EventType, encode_event, MSGPACK_CONTENT_TYPE
+from app.events.projection import ProjectionBase, ProductProjectionHandler, get_projected_product
+from app.events.testing import InMemoryBroker
+
+QUEUE = "produits.test"
+
+
+def product_event(product_id, version, event_type=EventType.UPDATED, **changes):
+    return encode_event(ProductEvent(
+        event_type=event_type,
+        product_id=product_id,
+        version=version,
+        changes=changes,
+    ))
+
+
+@pytest.fixture
+def projection_sessions():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    ProjectionBase.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine, autoflush=False)
+    engine.dispose()
+
+
+async def consume(broker, consumer, *bodies, content_type="application/json"):
+    task = asyncio.create_task(consumer.run(broker))
+    await asyncio.sleep(0)
+    while QUEUE not in broker.queues:
+        await asyncio.sleep(0.001)
+    for body in bodies:
+        await broker.publish(body, content_type=content_type)
+    await broker.wait_until_idle()
+    await broker.close()
+    await task
+
+
+def api_state(product_id, version, **fields):
+    return ProductEvent(event_type=EventType.UPDATED, product_id=product_id, version=version, changes=fields)
+
+
+@pytest.mark.asyncio
+async def test_projection_is_idempotent_per_version(projection_sessions):
+    broker = InMemoryBroker()
+    resynced = []
+
+    def resync(product_id):
+        resynced.append(product_id)
+        return api_state(1, 3, name="Renommé", description=None, stock=7, prices=[9.99, 12.5])
+
+    consumer = ProductEventConsumer(
+        ProductProjectionHandler(projection_sessions, resync), QUEUE, ack_flush_interval=0.01
+    )
+
+    await consume(
+        broker,
+        consumer,
+        product_event(1, 1, EventType.CREATED, name="Produit", stock=10, prices=[9.99, 12.5]),
+        product_event(1, 3, stock=7),  # la v2 manque : état complet relu
+        product_event(1, 2, name="Renommé"),  # arrivé en retard : déjà couvert
+        product_event(1, 3, stock=99),  # redélivrance : ignorée
+        product_event(1, 4, stock=6),  # version suivante : appliquée telle quelle
+        product_event(2, 1, EventType.CREATED, name="Supprimé", stock=1, prices=[1.0]),
+        product_event(2, 2, EventType.DELETED),
+        product_event(2, 1, EventType.CREATED, name="Supprimé", stock=1, prices=[1.0]),
+    )
+
+    with projection_sessions() as db:
+        projected = get_projected_product(db, 1)
+        assert projected.name == "Renommé"
+        assert projected.stock == 6
+        assert projected.version == 4
+        assert projected.price == 12.5
+        assert get_projected_product(db, 2) is None
+    assert resynced == [1]
+    assert len(broker.queues[QUEUE].acked) == 8
+
+
+def test_partial_update_of_unknown_product_is_resynced(projection_sessions):
+    handler = ProductProjectionHandler(
+        projection_sessions,
+        lambda product_id: api_state(product_id, 5, name="Complet", description="d", stock=3, prices=[2.0]),
+    )
+
+    assert handler.apply(ProductEvent(event_type=EventType.UPDATED, product_id=9, version=4, changes={"stock": 3}))
+
+    with projection_sessions() as db:
+        projected = get_projected_product(db, 9)
+        assert (projected.name, projected.stock, projected.version) == ("Complet", 3, 5)
+
+    # Produit supprimé à la source : une ligne supprimée, jamais une ligne partielle
+    gone = ProductProjectionHandler(projection_sessions, lambda product_id: None)
+    gone.apply(ProductEvent(event_type=EventType.UPDATED, product_id=10, version=2, changes={"stock": 1}))
+    with projection_sessions() as db:
+        assert get_projected_product(db, 10) is None
+
+
+@pytest.mark.asyncio
+async def test_msgpack_events_are_decoded_from_content_type(projection_sessions):
+    broker = InMemoryBroker()
+    consumer = ProductEventConsumer(
+        ProductProjectionHandler(projection_sessions), QUEUE, ack_flush_interval=0.01
+    )
+    body = encode_event(
+        ProductEvent(event_type=EventType.CREATED, product_id=5, version=1, changes={"name": "Msgpack", "stock": 3}),
+        MSGPACK_CONTENT_TYPE,
+    )
+
+    await consume(broker, consumer, body, content_type=MSGPACK_CONTENT_TYPE)
+
+    with projection_sessions() as db:
+        assert get_projected_product(db, 5).name == "Msgpack"
+
+
+@pytest.mark.asyncio
+async def test_acks_are_batched():
+    broker = InMemoryBroker()
+    handled = []
+
+    async def handler(event):
+        handled.append(event.product_id)
+
+    consumer = ProductEventConsumer(handler, QUEUE, prefetch_count=10, ack_batch_size=5, ack_flush_interval=0.01)
+    await consume(broker, consumer, *[product_event(i, 1) for i in range(10)])
+
+    assert handled == list(range(10))
+    assert len(broker.queues[QUEUE].acked) == 10
+    assert broker.queues[QUEUE].channel.ack_calls == 2
+
+
+@pytest.mark.asyncio
+async def test_failing_messages_go_to_dead_letter_queue():
+    broker = InMemoryBroker()
+    attempts = []
+
+    async def handler(event):
+        attempts.append(event.product_id)
+        raise RuntimeError("boom")
+
+    consumer = ProductEventConsumer(handler, QUEUE, ack_flush_interval=0.01)
+    event = product_event(1, 1)
+    await consume(broker, consumer, event, b"pas du json")
+
+    dead_letters = broker.queues[dead_letter_queue_name(QUEUE)].messages()
+    assert attempts == [1, 1]  # une remise en file, puis dead-letter
+    assert sorted(d.body for d in dead_letters) == sorted([event, b"pas du json"])
+    assert broker.queues[QUEUE].acked == []
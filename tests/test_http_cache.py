@@ -0,0 +1,96 @@
+import pytest
+from fastapi import status
+
+from app.middelware import auth, http_cache, rate_limit
+from app.middelware.compression import negotiate_encoding
+from app.models.product import Product as ProductModel
+
+
+def create_products(create_product, count, prefix):
+    for i in range(count):
+        create_product(
+            f"{prefix} {i}",
+            stock=i,
+            amount=10.0 + i,
+            description="Description suffisamment longue pour dépasser le seuil de compression",
+        )
+
+
+@pytest.mark.parametrize("accept, expected", [
+    ("gzip, deflate", "gzip"),
+    ("br;q=0.5, gzip;q=0.8", "gzip"),
+    ("gzip;q=0, identity", None),
+    ("*", "br"),
+    (None, None),
+])
+def test_negotiate_encoding(accept, expected):
+    pytest.importorskip("brotli")
+    assert negotiate_encoding(accept) == expected
+
+
+def test_large_list_is_gzipped(client, create_product):
+    create_products(create_product, 20, "Gzip")
+
+    response = client.get("/api/products/", headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert int(response.headers["Content-Length"]) < len(response.content)
+    assert len(response.json()) >= 20
+
+
+def test_brotli_when_preferred(client, create_product):
+    pytest.importorskip("brotli")
+    create_products(create_product, 20, "Brotli")
+
+    response = client.get("/api/products/", headers={"Accept-Encoding": "br"})
+
+    assert response.headers["Content-Encoding"] == "br"
+
+
+def test_small_responses_are_not_compressed(client):
+    response = client.get("/api/products/999999", headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in response.headers
+
+
+def test_cache_control_policies(client):
+    assert client.get("/api/products/").headers["Cache-Control"] == "max-age=5"
+    created = client.post("/api/products/", json={"name": "Policy", "stock": 1, "prices": [{"amount": 1}]})
+    assert created.headers["Cache-Control"] == "no-store"
+
+
+def test_list_pages_are_cached_until_a_write(client, db_session):
+    first = client.get("/api/products/", params={"limit": 500})
+
+    # Écriture directe en base : le cache n'est pas invalidé
+    db_session.add(ProductModel(name="Hors API", stock=1))
+    db_session.commit()
+    assert client.get("/api/products/", params={"limit": 500}).json() == first.json()
+
+    # Écriture via l'API : invalidation
+    client.post("/api/products/", json={"name": "Via API", "stock": 1, "prices": [{"amount": 1}]})
+    assert len(client.get("/api/products/", params={"limit": 500}).json()) == len(first.json()) + 2
+
+
+def test_cache_authorization_does_not_block_the_event_loop(client, mocker, recording_verifier):
+    mocker.patch.object(http_cache, "AUTH_ENABLED", True)
+
+    response = client.get("/api/products/", headers={"Authorization": "Bearer jeton"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert recording_verifier.in_event_loop == [False]
+
+
+def test_token_is_verified_once_per_request(client, mocker, recording_verifier):
+    for module in (auth, rate_limit, http_cache):
+        mocker.patch.object(module, "AUTH_ENABLED", True)
+    headers = {"Authorization": "Bearer jeton"}
+
+    # Limitation de débit, cache HTTP et verify_token partagent la même vérification
+    assert client.get("/api/products/", headers=headers).status_code == status.HTTP_200_OK
+    assert recording_verifier.in_event_loop == [False]
+
+    assert client.get("/api/products/", headers=headers).status_code == status.HTTP_200_OK
+    assert recording_verifier.in_event_loop == [False, False]
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta, timezone
+
+from fastapi import status
+
+from app.middelware.idempotency import DatabaseIdempotencyStore, InMemoryIdempotencyStore
+from app.models.idempotency import IdempotencyKey
+
+
+def test_retried_create_returns_cached_response(client, publisher):
+    payload = {"name": "Idempotent", "description": None, "stock": 3, "prices": [{"amount": 4.5}]}
+    headers = {"Idempotency-Key": "create-1"}
+
+    first = client.post("/api/products/", json=payload, headers=headers)
+    retry = client.post("/api/products/", json=payload, headers=headers)
+
+    assert first.status_code == status.HTTP_201_CREATED
+    assert retry.status_code == status.HTTP_201_CREATED
+    assert retry.json() == first.json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert len(publisher.events) == 1
+
+
+def test_broker_failure_does_not_undo_a_committed_create(client, broken_publisher):
+    payload = {"name": "Sans broker", "stock": 1, "prices": [{"amount": 2.0}]}
+    headers = {"Idempotency-Key": "create-broker-down"}
+
+    first = client.post("/api/products/", json=payload, headers=headers)
+    retry = client.post("/api/products/", json=payload, headers=headers)
+
+    assert first.status_code == status.HTTP_201_CREATED
+    assert retry.status_code == status.HTTP_201_CREATED
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json()["id"] == first.json()["id"]
+
+
+def test_key_reused_with_different_payload_is_rejected(client):
+    headers = {"Idempotency-Key": "create-2"}
+    client.post("/api/products/", json={"name": "A", "stock": 1, "prices": [{"amount": 1}]}, headers=headers)
+
+    response = client.post("/api/products/", json={"name": "B", "stock": 1, "prices": [{"amount": 1}]}, headers=headers)
+
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_failed_request_releases_key(client):
+    headers = {"Idempotency-Key": "update-1"}
+    product_id = client.post("/api/products/", json={"name": "C", "stock": 1, "prices": [{"amount": 1}]}).json()["id"]
+
+    failed = client.put(f"/api/products/{product_id}", json={"prices": [{"amount": -1}]}, headers=headers)
+    assert failed.status_code == status.HTTP_400_BAD_REQUEST
+
+    # La clé n'est pas restée réservée : un nouvel essai est traité normalement
+    retried = client.put(f"/api/products/{product_id}", json={"prices": [{"amount": -1}]}, headers=headers)
+    assert retried.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_in_memory_store_evicts_expired_keys():
+    store = InMemoryIdempotencyStore(ttl_seconds=60)
+    assert store.reserve("k", "fp") is None
+    assert store.reserve("k", "fp").fingerprint == "fp"
+
+    store._records["k"].expires_at -= timedelta(seconds=61)
+
+    assert store.reserve("k", "other") is None
+
+
+def test_in_memory_store_takes_over_expired_lock():
+    store = InMemoryIdempotencyStore(lock_seconds=30)
+    assert store.reserve("k", "fp") is None
+    store._records["k"].locked_until -= timedelta(seconds=31)
+
+    assert store.reserve("k", "other").fingerprint == "fp"
+    assert store.reserve("k", "fp") is None
+    assert store.reserve("k", "fp") is not None
+
+
+def test_abandoned_key_is_taken_over_after_its_lock_expires(db_session):
+    store = DatabaseIdempotencyStore(db_session, lock_seconds=30)
+    assert store.reserve("crashed", "fp") is None
+    assert not store.reserve("crashed", "fp").completed  # en cours : 409
+
+    # Le processus qui traitait la requête est mort : le bail expire
+    db_session.query(IdempotencyKey).filter(IdempotencyKey.key == "crashed").update(
+        {"locked_until": datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=1)}
+    )
+    db_session.commit()
+
+    assert store.reserve("crashed", "other").fingerprint == "fp"
+    assert store.reserve("crashed", "fp") is None
+    assert store.reserve("crashed", "fp") is not None  # bail renouvelé par la reprise
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+
+from app.jobs.price_retention import compact_price_history, ensure_price_partitions
+from app.models.price import Price as PriceModel
+from app.models.product import Product as ProductModel
+
+
+def add_prices(db, product, *rows):
+    for created_at, amount in rows:
+        db.add(PriceModel(product_id=product.id, amount=amount, created_at=created_at))
+    db.commit()
+
+
+def amounts(db, product):
+    return sorted(p.amount for p in db.query(PriceModel).filter(PriceModel.product_id == product.id))
+
+
+def test_old_history_is_collapsed_into_daily_snapshots(db_session):
+    product = ProductModel(name="Historique", stock=1)
+    db_session.add(product)
+    db_session.commit()
+
+    old_day = datetime(2020, 1, 10, 8)
+    add_prices(
+        db_session,
+        product,
+        (old_day, 1.0),
+        (old_day + timedelta(hours=2), 2.0),
+        (old_day + timedelta(hours=4), 3.0),   # instantané du 10/01
+        (old_day + timedelta(days=1), 4.0),    # seul prix du 11/01
+        (datetime.utcnow(), 5.0),              # prix courant, hors rétention
+        (datetime.utcnow(), 6.0),
+    )
+
+    deleted = compact_price_history(db_session, older_than_days=90, batch_size=1)
+
+    assert deleted == 2
+    assert amounts(db_session, product) == [3.0, 4.0, 5.0, 6.0]
+
+
+def test_current_price_set_is_never_compacted(db_session):
+    product = ProductModel(name="Inchangé depuis longtemps", stock=1)
+    db_session.add(product)
+    db_session.commit()
+
+    # Produit créé il y a longtemps avec plusieurs prix, jamais mis à jour depuis
+    created = datetime(2020, 3, 1, 12)
+    add_prices(db_session, product, (created, 9.0), (created + timedelta(seconds=1), 12.0))
+
+    compact_price_history(db_session, older_than_days=90)
+
+    assert amounts(db_session, product) == [9.0, 12.0]
+
+
+def test_partitions_are_postgres_only(db_session):
+    assert ensure_price_partitions(db_session) == []
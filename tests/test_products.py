@@ -1,4 +1,5 @@
 import pytest
+from sqlalchemy import text
 from fastapi import status
 
 def test_create_product(client, sample_product_data):
@@ -26,13 +27,13 @@ def test_get_product(client):
 
 def test_get_all_products(client):
     # Créer deux produits pour tester la liste
-    client.post("/products/", json={
+    client.post("/api/products/", json={
         "name": "Product 1",
         "description": "Desc 1",
         "stock": 1,
         "prices": [{"amount": 10.00}]
     })
-    client.post("/products/", json={
+    client.post("/api/products/", json={
         "name": "Product 2", 
         "description": "Desc 2",
         "stock": 2,
@@ -74,4 +75,47 @@ def test_delete_product(client):
     assert delete_response.status_code == status.HTTP_204_NO_CONTENT
     
     get_response = client.get(f"/api/products/{product_id}")
-    assert get_response.status_code == status.HTTP_404_NOT_FOUND
\ No newline at end of file
+    assert get_response.status_code == status.HTTP_404_NOT_FOUND
+
+def test_write_endpoints_publish_events(client, publisher):
+    product_id = client.post("/api/products/", json={
+        "name": "Published",
+        "stock": 1,
+        "prices": [{"amount": 1.00}]
+    }).json()["id"]
+    client.put(f"/api/products/{product_id}", json={"stock": 2})
+    client.delete(f"/api/products/{product_id}")
+
+    assert [e.event_type.value for e in publisher.events] == [
+        "product.created", "product.updated", "product.deleted"
+    ]
+    assert publisher.events[1].changes == {"stock": 2}
+
+
+def test_concurrent_write_is_rejected_by_version_check(client, db_session, mocker):
+    product_id = client.post("/api/products/", json={
+        "name": "Concurrent",
+        "stock": 5,
+        "prices": [{"amount": 1.00}]
+    }).json()["id"]
+
+    # Une réservation passe entre la lecture du produit et son UPDATE
+    from app.routers import product as product_router
+    snapshot = product_router.product_snapshot
+
+    def reserve_meanwhile(product):
+        db_session.execute(
+            text("UPDATE products SET stock = stock - 1, version = version + 1 WHERE id = :id"),
+            {"id": product_id}
+        )
+        return snapshot(product)
+
+    mocker.patch.object(product_router, "product_snapshot", side_effect=reserve_meanwhile)
+    response = client.put(f"/api/products/{product_id}", json={"name": "Renamed"})
+    assert response.status_code == status.HTTP_409_CONFLICT
+
+    assert client.get(f"/api/products/{product_id}").json()["name"] == "Concurrent"
+
+    mocker.stopall()
+    retried = client.put(f"/api/products/{product_id}", json={"name": "Renamed"})
+    assert (retried.json()["name"], retried.json()["version"]) == ("Renamed", 2)
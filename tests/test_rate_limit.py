@@ -0,0 +1,112 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI, WebSocket, status
+from starlette.websockets import WebSocketDisconnect
+from fastapi.testclient import TestClient
+from jwt import JWT
+from jwt.jwk import OctetJWK
+
+from app.middelware import auth, rate_limit
+from app.middelware.auth import TokenVerifier
+from app.middelware.rate_limit import RateLimitMiddleware
+
+
+def make_client(client=("10.0.0.1", 50000), **options):
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    def read_item(item_id: int):
+        return {"id": item_id}
+
+    @app.websocket("/ws")
+    async def echo(websocket: WebSocket):
+        await websocket.accept()
+        await websocket.send_text("ok")
+        await websocket.close()
+
+    app.add_middleware(RateLimitMiddleware, **options)
+    return TestClient(app, client=client)
+
+
+def test_token_bucket_per_client_and_route():
+    client = make_client(rate=0.001, burst=2)
+
+    # /items/1 et /items/2 partagent le bucket de la route /items/{item_id}
+    assert client.get("/items/1").status_code == status.HTTP_200_OK
+    assert client.get("/items/2").status_code == status.HTTP_200_OK
+    limited = client.get("/items/3")
+    assert limited.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert int(limited.headers["Retry-After"]) > 0
+
+    # Changer d'en-tête X-Client-Id ne donne pas un nouveau bucket
+    assert client.get("/items/1", headers={"X-Client-Id": "autre"}).status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+    # Une autre adresse dispose de son propre bucket
+    assert make_client(client=("10.0.0.2", 50000), rate=0.001, burst=2).get("/items/1").status_code == status.HTTP_200_OK
+
+
+def test_client_id_header_is_trusted_only_from_proxies():
+    client = make_client(client=("10.0.0.9", 50000), rate=0.001, burst=1, trusted_proxies={"10.0.0.9"})
+
+    assert client.get("/items/1", headers={"X-Client-Id": "a"}).status_code == status.HTTP_200_OK
+    assert client.get("/items/1", headers={"X-Client-Id": "a"}).status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert client.get("/items/1", headers={"X-Client-Id": "b"}).status_code == status.HTTP_200_OK
+    assert client.get("/items/1", headers={"X-Forwarded-For": "1.2.3.4, 5.6.7.8"}).status_code == status.HTTP_200_OK
+
+
+def test_authenticated_clients_are_limited_by_subject(monkeypatch):
+    secret = OctetJWK(b"secret-de-test")
+    monkeypatch.setattr(rate_limit, "AUTH_ENABLED", True)
+    monkeypatch.setattr(auth, "get_token_verifier", lambda: TokenVerifier(secret))
+
+    def bearer(sub):
+        return {"Authorization": f"Bearer {JWT().encode({'sub': sub}, secret, alg='HS256')}"}
+
+    client = make_client(rate=0.001, burst=1)
+    assert client.get("/items/1", headers=bearer("alice")).status_code == status.HTTP_200_OK
+    assert client.get("/items/1", headers=bearer("alice")).status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    # Même adresse, autre utilisateur
+    assert client.get("/items/1", headers=bearer("bob")).status_code == status.HTTP_200_OK
+
+
+def test_websocket_handshakes_are_rate_limited():
+    client = make_client(rate=0.001, burst=1)
+
+    with client.websocket_connect("/ws") as websocket:
+        assert websocket.receive_text() == "ok"
+
+    with pytest.raises(WebSocketDisconnect) as refused:
+        with client.websocket_connect("/ws"):
+            pass
+    assert refused.value.code == status.WS_1013_TRY_AGAIN_LATER
+
+
+def test_route_limits_override_default():
+    client = make_client(rate=100, burst=100, route_limits={"GET /items/{item_id}": (0.001, 1)})
+
+    assert client.get("/items/1").status_code == status.HTTP_200_OK
+    assert client.get("/items/1").status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+
+def test_load_shedding_when_pool_waits_are_high():
+    monitor = SimpleNamespace(average=0.5)
+    client = make_client(wait_threshold_ms=100, min_in_flight=0, retry_after=3, monitor=monitor)
+
+    shed = client.get("/items/1")
+    assert shed.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert shed.headers["Retry-After"] == "3"
+
+    monitor.average = 0.01
+    assert client.get("/items/1").status_code == status.HTTP_200_OK
+
+
+def test_page_size_is_bounded(client):
+    response = client.get("/api/products/", params={"limit": 100000})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_counters_are_exposed_on_metrics(client):
+    body = client.get("/metrics").text
+    assert "http_requests_rate_limited_total" in body
+    assert "db_pool_checkout_wait_seconds" in body
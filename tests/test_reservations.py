@@ -0,0 +1,131 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+from fastapi import HTTPException, status
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+from app.config.database import Base
+from app.jobs.reservation_expiry import release_expired_reservations
+from app.models.product import Product as ProductModel
+from app.models.reservation import StockReservation
+from app.routers.reservation import reserve_stock
+
+
+def stock_of(client, product_id):
+    return client.get(f"/api/products/{product_id}").json()["stock"]
+
+
+def test_reserve_and_release_restore_stock(client, create_product, publisher):
+    product_id = create_product("Réservable", 5)
+
+    response = client.post(f"/api/products/{product_id}/reserve", json={"quantity": 3})
+    assert response.status_code == status.HTTP_201_CREATED
+    reservation = response.json()
+    assert stock_of(client, product_id) == 2
+
+    refused = client.post(f"/api/products/{product_id}/reserve", json={"quantity": 3})
+    assert refused.status_code == status.HTTP_409_CONFLICT
+    assert stock_of(client, product_id) == 2
+
+    released = client.post(f"/api/products/{product_id}/release", json={"reservation_id": reservation["id"]})
+    assert released.status_code == status.HTTP_204_NO_CONTENT
+    assert stock_of(client, product_id) == 5
+    again = client.post(f"/api/products/{product_id}/release", json={"reservation_id": reservation["id"]})
+    assert again.status_code == status.HTTP_404_NOT_FOUND
+
+    assert [e.changes for e in publisher.events[1:]] == [{"stock": 2}, {"stock": 5}]
+
+
+def test_basket_is_reserved_all_or_nothing(client, create_product):
+    plenty = create_product("Panier A", 10)
+    scarce = create_product("Panier B", 1)
+
+    refused = client.post("/api/products/reserve", json={"items": [
+        {"product_id": plenty, "quantity": 4},
+        {"product_id": scarce, "quantity": 2},
+    ]})
+    assert refused.status_code == status.HTTP_409_CONFLICT
+    assert (stock_of(client, plenty), stock_of(client, scarce)) == (10, 1)
+
+    reserved = client.post("/api/products/reserve", json={"items": [
+        {"product_id": plenty, "quantity": 4},
+        {"product_id": scarce, "quantity": 1},
+        {"product_id": plenty, "quantity": 1},
+    ]})
+    assert reserved.status_code == status.HTTP_201_CREATED
+    assert (stock_of(client, plenty), stock_of(client, scarce)) == (5, 0)
+
+    ids = [r["id"] for r in reserved.json()]
+    assert client.post("/api/products/release", json={"reservation_ids": ids}).status_code == status.HTTP_204_NO_CONTENT
+    assert (stock_of(client, plenty), stock_of(client, scarce)) == (10, 1)
+
+
+def test_retry_after_broker_failure_does_not_reserve_twice(client, create_product, broken_publisher):
+    product_id = create_product("Broker en panne", 5)
+    headers = {"Idempotency-Key": "reserve-broker-down"}
+
+    first = client.post(f"/api/products/{product_id}/reserve", json={"quantity": 4}, headers=headers)
+    retry = client.post(f"/api/products/{product_id}/reserve", json={"quantity": 4}, headers=headers)
+
+    assert first.status_code == status.HTTP_201_CREATED
+    assert retry.status_code == status.HTTP_201_CREATED
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json()["id"] == first.json()["id"]
+    assert stock_of(client, product_id) == 1
+
+
+def test_unknown_product_is_not_found(client):
+    response = client.post("/api/products/999999/reserve", json={"quantity": 1})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_expired_reservations_are_released(client, create_product, db_session):
+    product_id = create_product("Expirable", 4)
+    kept = client.post(f"/api/products/{product_id}/reserve", json={"quantity": 1}).json()
+    expired = client.post(f"/api/products/{product_id}/reserve", json={"quantity": 2}).json()
+    db_session.query(StockReservation).filter(StockReservation.id == expired["id"]).update(
+        {"expires_at": datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=1)}
+    )
+
+    assert release_expired_reservations(db_session) == 1
+    assert stock_of(client, product_id) == 3
+    assert db_session.query(StockReservation.id).filter(StockReservation.product_id == product_id).all() == [(kept["id"],)]
+
+
+def test_concurrent_reservations_never_oversell(tmp_path):
+    # Base fichier (et non en mémoire) : chaque thread a sa propre connexion, comme en production
+    engine = create_engine(f"sqlite:///{tmp_path / 'stock.db'}", connect_args={"timeout": 30})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    with Session() as db:
+        product = ProductModel(name="Hot SKU", stock=25)
+        db.add(product)
+        db.commit()
+        product_id = product.id
+
+    results = []
+    start = threading.Barrier(100)
+
+    def buyer():
+        start.wait()
+        with Session() as db:
+            try:
+                reserve_stock(db, {product_id: 1}, 60)
+                results.append("ok")
+            except HTTPException as e:
+                results.append(e.status_code)
+
+    threads = [threading.Thread(target=buyer) for _ in range(100)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with Session() as db:
+        product = db.get(ProductModel, product_id)
+        reserved = db.query(func.sum(StockReservation.quantity)).scalar()
+        assert (product.stock, product.version) == (0, 26)
+    assert results.count("ok") == reserved == 25
+    assert results.count(status.HTTP_409_CONFLICT) == 75
+    engine.dispose()
@@ -0,0 +1,39 @@
+import subprocess
+import sys
+
+import pytest
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+
+import app.main as main
+from app.main import app
+
+
+def test_import_does_not_load_broker_or_database_clients():
+    code = (
+        "import sys, app.main\n"
+        "from app.config.database import get_engine\n"
+        "print('pika' in sys.modules, 'aio_pika' in sys.modules, get_engine.cache_info().currsize)"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ["False", "False", "0"]
+
+
+def test_prewarm_opens_a_pool_connection(mocker, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'prewarm.db'}")
+    mocker.patch.object(main, "get_engine", return_value=engine)
+    mocker.patch.object(main, "STARTUP_PREWARM", True)
+
+    with TestClient(app) as client:
+        assert engine.pool.checkedin() == 1
+        assert client.get("/metrics").status_code == 200
+
+
+def test_auth_without_secret_refuses_to_start(mocker):
+    mocker.patch.object(main, "AUTH_ENABLED", True)
+    mocker.patch.object(main, "get_token_verifier", side_effect=RuntimeError("AUTH_ENABLED exige SECRET_KEY ou JWKS_URL"))
+
+    with pytest.raises(RuntimeError):
+        with TestClient(app):
+            pass
@@ -0,0 +1,149 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from fastapi import WebSocketDisconnect, status
+
+from app.events.consumer import ProductEventConsumer
+from app.events.envelope import EventType, ProductEvent, encode_event
+from app.events.hub import EventHub, StreamMessage, SubscriptionClosed, get_event_hub
+from app.events.testing import InMemoryBroker
+from app.main import app
+from app.routers import stream
+
+QUEUE = "produits.stream.test"
+
+
+def product_event(product_id, version=2, **changes):
+    return ProductEvent(event_type=EventType.UPDATED, product_id=product_id, version=version, changes=changes)
+
+
+@pytest.fixture
+def hub(client):
+    hub = EventHub()
+    app.dependency_overrides[get_event_hub] = lambda: hub
+    return hub
+
+
+def wait_for_subscribers(hub, count=1, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while hub.subscriber_count < count:
+        assert time.monotonic() < deadline, "aucun abonné"
+        time.sleep(0.005)
+
+
+@pytest.mark.asyncio
+async def test_hub_filters_by_product_and_encodes_once(mocker):
+    hub = EventHub()
+    everything = hub.subscribe()
+    only_two = hub.subscribe(frozenset({2}))
+    encode = mocker.spy(StreamMessage, "from_event")
+
+    await hub.handle(product_event(1, stock=1))
+    await hub.handle(product_event(2, stock=2))
+
+    assert [(await everything.get()).product_id, (await everything.get()).product_id] == [1, 2]
+    assert (await only_two.get()).product_id == 2
+    assert encode.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_is_disconnected_without_blocking_others():
+    hub = EventHub(buffer=2)
+    slow = hub.subscribe()
+    fast = hub.subscribe()
+
+    for version in range(2, 5):
+        await hub.handle(product_event(1, version=version))
+        assert (await fast.get()).product_id == 1
+
+    with pytest.raises(SubscriptionClosed) as closed:
+        await slow.get()
+    assert closed.value.reason == "lagged"
+
+
+@pytest.mark.asyncio
+async def test_single_broker_subscription_feeds_every_subscriber():
+    broker = InMemoryBroker()
+    consumers = []
+
+    async def source(handler):
+        consumer = ProductEventConsumer(handler, QUEUE, exclusive=True, dead_letter=False, ack_flush_interval=0.01)
+        consumers.append(consumer)
+        await consumer.run(broker)
+
+    hub = EventHub(source)
+    subscriptions = [hub.subscribe() for _ in range(50)]
+    while QUEUE not in broker.queues:
+        await asyncio.sleep(0.001)
+
+    await broker.publish(encode_event(product_event(7, stock=3)))
+    messages = [await subscription.get() for subscription in subscriptions]
+
+    assert len(consumers) == 1
+    assert {m.product_id for m in messages} == {7}
+    assert len({id(m) for m in messages}) == 1
+    assert "produits.stream.test.dlq" not in broker.queues
+    hub.close()
+    await asyncio.sleep(0)
+    await broker.close()
+
+
+def test_websocket_receives_filtered_events(client, hub):
+    with client.websocket_connect("/api/products/ws?ids=1,3") as websocket:
+        hub.publish(product_event(2, stock=5))
+        hub.publish(product_event(3, stock=9))
+
+        message = json.loads(websocket.receive_text())
+        assert (message["product_id"], message["changes"]) == (3, {"stock": 9})
+
+    wait_for_subscribers(hub, 0)
+
+
+def test_websocket_token_is_verified_off_the_event_loop(client, hub, mocker, recording_verifier):
+    mocker.patch.object(stream, "AUTH_ENABLED", True)
+
+    with client.websocket_connect("/api/products/ws?token=jeton") as websocket:
+        hub.publish(product_event(1, stock=2))
+        assert json.loads(websocket.receive_text())["product_id"] == 1
+
+    assert recording_verifier.in_event_loop == [False]
+
+
+
+def test_websocket_accepts_bearer_header_and_rejects_missing_token(client, hub, mocker, recording_verifier):
+    mocker.patch.object(stream, "AUTH_ENABLED", True)
+
+    with client.websocket_connect("/api/products/ws", headers={"Authorization": "Bearer jeton"}) as websocket:
+        hub.publish(product_event(1, stock=2))
+        assert json.loads(websocket.receive_text())["product_id"] == 1
+
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with client.websocket_connect("/api/products/ws"):
+            pass
+    assert closed.value.code == status.WS_1008_POLICY_VIOLATION
+
+def test_sse_stream_sends_events_until_shutdown(client, hub):
+    def publish_then_close():
+        wait_for_subscribers(hub)
+        hub.publish(product_event(1, stock=4))
+        hub.publish(product_event(2, stock=8))
+        hub.close()
+
+    publisher = threading.Thread(target=publish_then_close)
+    publisher.start()
+    response = client.get("/api/products/stream", params={"ids": "2"})
+    publisher.join()
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    frames = response.text.strip().split("\n\n")
+    assert frames[0] == "retry: 3000"
+    assert frames[1].startswith("event: product.updated\ndata: ")
+    assert json.loads(frames[1].split("data: ", 1)[1])["product_id"] == 2
+    assert frames[2] == "event: shutdown\ndata: {}"
+
+
+def test_invalid_ids_filter_is_rejected(client, hub):
+    assert client.get("/api/products/stream", params={"ids": "1,x"}).status_code == 400